@@ -5,16 +5,20 @@ from jose import jwt, JWTError
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
-from scripts.crud import SECRET_KEY, ALGORITHM
-from routers import auth, upload , history, result, download
+from scripts.crud import SECRET_KEY, ALGORITHM, backfill_document_summaries
+from routers import auth, upload , history, result, download, progress, overlay, tiles
 from scripts.models import Base
-from scripts.db import engine
+from scripts.db import SessionLocal, ensure_schema
+from scripts.auth_cache import token_cache
 
 load_dotenv()
 
 app = FastAPI()
 
-Base.metadata.create_all(bind=engine)
+ensure_schema(Base.metadata)
+# документы, проанализированные до хранения итога в БД, — один раз при запуске, а не на каждый /history
+with SessionLocal() as _db:
+    backfill_document_summaries(_db)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +26,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # курсор следующей страницы /history; валидаторы и диапазоны для загрузки PDF
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 PUBLIC_PATHS = {
@@ -35,6 +41,16 @@ def _strip_bearer(auth_header: str | None):
         return auth_header[len("Bearer "):]
     return None
 
+@app.middleware("http")
+async def upload_size_middleware(request: Request, call_next):
+    # большую загрузку отклоняем по Content-Length до того, как тело будет принято и сохранено во временный файл
+    if request.method == "POST" and request.url.path == "/upload":
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > upload.MAX_UPLOAD_BYTES:
+            return JSONResponse(status_code=413,
+                                content={"detail": f"File is larger than {upload.MAX_UPLOAD_MB} MB"})
+    return await call_next(request)
+
 @app.middleware("http")
 async def jwt_auth_middleware(request: Request, call_next):
     if request.method == "OPTIONS" or request.url.path in PUBLIC_PATHS:
@@ -45,17 +61,26 @@ async def jwt_auth_middleware(request: Request, call_next):
     if not token:
         return JSONResponse(status_code=401, content={"detail": "Authorization header is missing or invalid"})
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        exp = payload.get("exp")
-        if exp is not None and datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(tz=timezone.utc):
-            return JSONResponse(status_code=401, content={"detail": "Token expired"})
-        username: str = payload.get("sub")
-        if username is None:
-            raise JWTError("No sub in token")
-        request.state.user = username
-    except JWTError:
-        return JSONResponse(status_code=401, content={"detail": "Token is invalid or expired"})
+    # расшифрованный токен берём из кэша (на время жизни записи, но не дольше срока токена)
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            exp = payload.get("exp")
+            if exp is not None and datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(tz=timezone.utc):
+                return JSONResponse(status_code=401, content={"detail": "Token expired"})
+            username: str = payload.get("sub")
+            if username is None:
+                raise JWTError("No sub in token")
+        except JWTError:
+            return JSONResponse(status_code=401, content={"detail": "Token is invalid or expired"})
+        claims = {"login": username, "uid": payload.get("uid")}
+        ttl = exp - datetime.now(tz=timezone.utc).timestamp() if exp is not None else None
+        token_cache.set(token, claims, ttl)
+
+    request.state.user = claims["login"]
+    # старые токены без uid: id найдёт get_current_user_id (через кэш login → id)
+    request.state.user_id = claims["uid"]
 
     return await call_next(request)
 
@@ -63,4 +88,7 @@ app.include_router(auth.router)
 app.include_router(upload.router)
 app.include_router(history.router)
 app.include_router(result.router)
-app.include_router(download.router)
\ No newline at end of file
+app.include_router(download.router)
+app.include_router(progress.router)
+app.include_router(overlay.router)
+app.include_router(tiles.router)
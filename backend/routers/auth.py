@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from scripts.crud import authenticate_user, create_access_token, create_user
-from scripts.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.crud import create_access_token
+from scripts.async_crud import authenticate_user, create_user
+from scripts.db import get_async_db
+from scripts.auth_cache import invalidate_user
 from datetime import timedelta
 from rich import print
 
@@ -13,16 +15,18 @@ class Login(BaseModel):
     password: str
 
 @router.post("/login")
-def login_for_access_token(form_data: Login, db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.login, form_data.password)
+async def login_for_access_token(form_data: Login, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.login, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect login or password")
     access_token_expires = timedelta(minutes=9999)
-    access_token = create_access_token(data={"sub": user.login}, expires_delta=access_token_expires)
+    # uid в claims: роутерам не нужно искать пользователя по логину на каждом запросе
+    access_token = create_access_token(data={"sub": user.login, "uid": user.id}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/reg")
-def registration_user(form_data: Login, db: Session = Depends(get_db)):
-    create_user(db, form_data.login, form_data.password)
+async def registration_user(form_data: Login, db: AsyncSession = Depends(get_async_db)):
+    await create_user(db, form_data.login, form_data.password)
+    invalidate_user(form_data.login)
     return {"message": "succ reg"}
     
\ No newline at end of file
@@ -1,7 +1,29 @@
 from fastapi import Request, HTTPException
+from scripts.auth_cache import user_id_cache
+from scripts.db import AsyncSessionLocal
+from scripts.async_crud import get_user_by_login
 
 def get_current_user(request: Request):
     user = request.state.user
     if not user:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
-    return user
\ No newline at end of file
+    return user
+
+async def get_current_user_id(request: Request) -> int:
+    """
+    Числовой id пользователя без запроса к БД: из claim uid токена (см. jwt_auth_middleware).
+    Для токенов, выданных до появления uid, — по логину через кэш, при промахе — один запрос.
+    """
+    login = get_current_user(request)
+    uid = getattr(request.state, "user_id", None)
+    if uid is not None:
+        return int(uid)
+    uid = user_id_cache.get(login)
+    if uid is None:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_login(db, login)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        uid = user.id
+        user_id_cache.set(login, uid)
+    return uid
@@ -1,38 +1,51 @@
+import asyncio
+import json
 import os
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from scripts.db import get_db
-from scripts.crud import get_document, get_user_by_login
-from routers.dependencies import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import get_document
+from routers.dependencies import get_current_user_id
+from scripts.analysis.annotate import annotation_key, ensure_annotated
+from routers.file_responses import CACHE_IMMUTABLE, CACHE_REVALIDATE, file_response
 
 router = APIRouter()
 
-@router.get("/download/{doc_id}")
-def download_original(doc_id: int, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    user = get_user_by_login(db, current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    doc = get_document(db, doc_id)
-    if not doc or doc.user_id != user.id:
+@router.api_route("/download/{doc_id}", methods=["GET", "HEAD"])
+async def download_original(doc_id: int, request: Request, db: AsyncSession = Depends(get_async_db),
+                            user_id: int = Depends(get_current_user_id)):
+    doc = await get_document(db, doc_id)
+    if not doc or doc.user_id != user_id:
         raise HTTPException(status_code=404, detail="Document not found")
     file_path = os.path.join("data", "original", str(doc_id), doc.filename)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, filename=doc.filename)
+    # sha256 содержимого посчитан при загрузке — ETag не зависит от mtime (жёсткие ссылки, копирование)
+    etag = f'"{doc.content_hash}"' if doc.content_hash else None
+    return file_response(request, file_path, doc.filename, etag=etag, cache_control=CACHE_REVALIDATE)
 
-@router.get("/download_annotated/{doc_id}")
-def download_annotated(doc_id: int, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    user = get_user_by_login(db, current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    doc = get_document(db, doc_id)
-    if not doc or doc.user_id != user.id:
+@router.api_route("/download_annotated/{doc_id}", methods=["GET", "HEAD"])
+async def download_annotated(doc_id: int, request: Request, db: AsyncSession = Depends(get_async_db),
+                             user_id: int = Depends(get_current_user_id)):
+    doc = await get_document(db, doc_id)
+    if not doc or doc.user_id != user_id:
         raise HTTPException(status_code=404, detail="Document not found")
     if not doc.ann_pdf_path:
         raise HTTPException(status_code=404, detail="Annotated file not available")
     file_path = doc.ann_pdf_path
+    annotated_filename = os.path.basename(file_path)
+    if doc.violations is not None:
+        # строится при первом запросе и берётся с диска, пока нарушения и исходный PDF те же;
+        # при смене отрисовки файл перестраивается, поэтому кэш клиента проверяется по ключу
+        original_path = os.path.join("data", "original", str(doc_id), doc.filename)
+        if not os.path.exists(original_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        violations = json.loads(doc.violations)
+        source_id = doc.content_hash or ""
+        await asyncio.to_thread(ensure_annotated, original_path, violations, file_path, source_id)
+        etag = f'"{annotation_key(source_id, violations)}"'
+        return file_response(request, file_path, annotated_filename, etag=etag, cache_control=CACHE_REVALIDATE)
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Annotated file not found")
-    annotated_filename = os.path.basename(file_path)
-    return FileResponse(file_path, filename=annotated_filename)
\ No newline at end of file
+    # документы, проанализированные до отложенной обводки: файл построен при анализе и не меняется
+    return file_response(request, file_path, annotated_filename, cache_control=CACHE_IMMUTABLE)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+# =========================
+# Отдача файлов с валидаторами кэша: ETag / Last-Modified, 304, диапазоны байт (206)
+# =========================
+# Просмотрщик PDF запрашивает файл частями (Range), браузер повторно не скачивает
+# неизменённый файл (If-None-Match / If-Modified-Since → 304).
+
+CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# оригинал и аннотированный PDF документа не меняются: id документа — новая загрузка
+CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+CACHE_REVALIDATE = "private, no-cache"
+
+
+def file_etag(st: os.stat_result) -> str:
+    """Сильный ETag по времени изменения и размеру файла."""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: W/"x" совпадает с "x"
+    tags = [t.strip() for t in header.split(",")]
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+def etag_not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match совпадает с etag — можно ответить 304, не читая содержимое."""
+    inm = request.headers.get("if-none-match")
+    return inm is not None and _etag_matches(inm, etag)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """(start, end) включительно для одного диапазона; None — диапазон не поддерживается (отдаём файл целиком)."""
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None  # несколько диапазонов или другие единицы — допустимо ответить 200
+    first, last = m.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+async def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def bytes_response(request: Request, data: bytes, etag: str, cache_control: str = CACHE_REVALIDATE,
+                   media_type: str = "application/octet-stream") -> Response:
+    """Небольшое содержимое из памяти (плитки превью): 304 по If-None-Match, иначе 200 целиком."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(data))
+        return Response(headers=headers, media_type=media_type)
+    return Response(content=data, headers=headers, media_type=media_type)
+
+
+def file_response(request: Request, path: str, filename: str, etag: str | None = None,
+                  cache_control: str = CACHE_REVALIDATE, media_type: str = "application/pdf",
+                  attachment: bool = True) -> Response:
+    """
+    Ответ с файлом: 304 при совпадении валидаторов, 206 для Range (один диапазон, с учётом If-Range), иначе 200.
+    etag по умолчанию — по mtime и размеру; можно передать свой (например, по хэшу содержимого).
+    """
+    st = os.stat(path)
+    etag = etag or file_etag(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    disposition = "attachment" if attachment else "inline"
+    headers["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+
+    size = st.st_size
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: диапазон отдаём, только если у клиента та же версия файла
+    if range_header and size > 0 and (if_range is None or if_range.strip() == etag):
+        rng = _parse_range(range_header, size)
+        if rng is not None:
+            start, end = rng
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(_iter_file(path, start, length), status_code=status,
+                             headers=headers, media_type=media_type)
@@ -1,43 +1,63 @@
-import os
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from scripts.db import get_db
-from scripts.crud import get_documents_for_user, get_user_by_login
-from routers.dependencies import get_current_user
-from scripts.parse_report import parse_report
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import get_history_page, get_latest_job_statuses
+from routers.dependencies import get_current_user_id
 
 router = APIRouter()
 
 @router.get("/history")
-def get_history(db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    user = get_user_by_login(db, current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    docs = get_documents_for_user(db, user.id)
-    
+async def get_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    criterion: Optional[str] = None,
+    filename: Optional[str] = None,
+    sort: str = Query("-upload_date", pattern=r"^-?(upload_date|total_violations|filename)$"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)):
+    """
+    Страница истории. Тело — список, как и раньше; курсор следующей страницы — в заголовке X-Next-Cursor
+    (нет заголовка — страница последняя).
+    """
+    # итог документов, проанализированных до хранения итога в БД, заполняется при запуске (app.py)
+    try:
+        docs, next_cursor = await get_history_page(db, user_id, limit=limit, cursor=cursor,
+                                                   date_from=date_from, date_to=date_to,
+                                                   criterion=criterion, filename=filename, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    unfinished = [d.id for d in docs if not d.description]
+    job_statuses = await get_latest_job_statuses(db, unfinished)
+
     history = []
     for d in docs:
         item = {
-            "id": user.id,
+            "id": user_id,
             "doc_id": d.id,
             "filename": d.filename,
             "upload_date": d.upload_date,
         }
-        
+
         if d.description:
-            report_path = d.description
-            if os.path.exists(report_path):
-                with open(report_path, "r", encoding="utf-8") as f:
-                    report_content = f.read()
-                parsed_data = parse_report(report_content)
-                item["error_points"] = parsed_data["error_points"]
-                item["error_counts"] = parsed_data["error_counts"]
-                item["total_violations"] = parsed_data["total_violations"]
+            if d.total_violations is not None:
+                error_counts = json.loads(d.error_counts) if d.error_counts else {}
+                item["error_points"] = list(error_counts.keys())
+                item["error_counts"] = error_counts
+                item["total_violations"] = d.total_violations
             else:
                 item["status"] = "report missing"
         else:
-            item["status"] = "processing"
-        
+            item["status"] = "error" if job_statuses.get(d.id) == "failed" else "processing"
+
         history.append(item)
-    
-    return history
\ No newline at end of file
+
+    return history
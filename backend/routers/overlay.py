@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import get_document
+from scripts.analysis.annotate import read_page_sizes
+from routers.dependencies import get_current_user_id
+
+router = APIRouter()
+
+
+async def _page_sizes(db: AsyncSession, doc) -> list:
+    """Размеры листов из БД; у документов, проанализированных раньше, — один раз из оригинала."""
+    if doc.page_sizes:
+        return json.loads(doc.page_sizes)
+    original_path = os.path.join("data", "original", str(doc.id), doc.filename)
+    if not os.path.exists(original_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    sizes = await asyncio.to_thread(read_page_sizes, original_path)
+    doc.page_sizes = json.dumps(sizes)
+    await db.commit()
+    return sizes
+
+
+@router.get("/overlay/{doc_id}")
+async def get_overlay(doc_id: int,
+                      page: Optional[int] = Query(None, ge=1),
+                      criterion: Optional[str] = None,
+                      db: AsyncSession = Depends(get_async_db),
+                      user_id: int = Depends(get_current_user_id)):
+    """
+    Рамки нарушений для отрисовки поверх оригинала на клиенте (вместо аннотированного PDF).
+    bbox — [x0, y0, x1, y1] в пунктах от левого верхнего угла листа без учёта поворота,
+    в тех же координатах, что width/height листа; rotation — поворот листа при показе.
+    page / criterion — только кластеры этого листа / этого пункта.
+    """
+    doc = await get_document(db, doc_id)
+    if not doc or doc.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.description is None or doc.violations is None:
+        # анализ не завершён или выполнен до хранения нарушений в БД — есть только /download_annotated
+        raise HTTPException(status_code=404, detail="Overlay not available")
+
+    sizes = await _page_sizes(db, doc)
+    violations = json.loads(doc.violations)
+    if page is not None:
+        violations = [v for v in violations if v["page"] == page]
+    if criterion:
+        violations = [v for v in violations if criterion in v["criteria"]]
+
+    return {
+        "id": doc.id,
+        "pages": [{"page": n, "width": w, "height": h, "rotation": rot}
+                  for n, (w, h, rot) in enumerate(sizes, start=1)],
+        "violations": violations,
+    }
@@ -0,0 +1,155 @@
+# routers/progress.py
+import asyncio
+import json
+import os
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from scripts.db import AsyncSessionLocal
+from scripts.async_crud import (
+    get_document, get_document_summary, get_events_after, get_latest_job,
+)
+from scripts.progress import TERMINAL_EVENTS
+from scripts.progress_hub import progress_hub
+from routers.dependencies import get_current_user_id
+
+router = APIRouter()
+
+# =========================
+# Ход анализа: события пишут воркеры (таблица analysis_events), здесь они отдаются клиенту
+# =========================
+# GET /progress/{id}/stream — Server-Sent Events, закрывается после done/failed;
+# GET /progress/{id}?after=N  — long-poll для клиентов без потокового чтения ответа.
+# БД перечитывается по уведомлению (scripts/progress_hub.py): с PostgreSQL — по NOTIFY воркера,
+# иначе — с паузой от PROGRESS_POLL_SECONDS, удваивающейся до PROGRESS_POLL_MAX_SECONDS, пока событий нет.
+
+PROGRESS_POLL_SECONDS = float(os.getenv("PROGRESS_POLL_SECONDS", "0.5"))
+PROGRESS_POLL_MAX_SECONDS = float(os.getenv("PROGRESS_POLL_MAX_SECONDS", "4"))
+PROGRESS_KEEPALIVE_SECONDS = float(os.getenv("PROGRESS_KEEPALIVE_SECONDS", "15"))
+PROGRESS_LONGPOLL_MAX_SECONDS = 60.0
+
+
+async def _check_access(doc_id: int, user_id: int):
+    async with AsyncSessionLocal() as db:
+        doc = await get_document(db, doc_id)
+        if not doc or doc.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+
+async def _final_event(db, doc_id: int) -> dict | None:
+    """
+    Итоговое событие по состоянию документа — если анализ уже закончен, а своего события нет
+    (повторная загрузка того же PDF, документы до появления событий) или оно раньше after.
+    """
+    doc = await get_document(db, doc_id)
+    if doc is None:
+        return None
+    if doc.ann_pdf_path is not None and doc.description is not None:
+        data = await get_document_summary(db, doc) or {}
+        return {"id": 0, "kind": "done", "criterion": None, "data": data, "created_at": None}
+    job = await get_latest_job(db, doc_id)
+    if job is not None and job.status == "failed":
+        return {"id": 0, "kind": "failed", "criterion": None,
+                "data": {"job_id": job.id, "error": "Анализ не выполнен"}, "created_at": None}
+    return None
+
+
+async def _fetch(doc_id: int, after: int) -> tuple[list[dict], bool]:
+    """Новые события после after и признак, что анализ закончен."""
+    async with AsyncSessionLocal() as db:
+        events = await get_events_after(db, doc_id, after)
+        if any(ev["kind"] in TERMINAL_EVENTS for ev in events):
+            return events, True
+        if not events:
+            final = await _final_event(db, doc_id)
+            if final is not None:
+                return [final], True
+        return events, False
+
+
+def _wait_seconds(pause: float) -> float:
+    """Сколько ждать уведомления до следующего чтения БД (pause — текущая пауза опроса)."""
+    if progress_hub.listening:
+        return PROGRESS_KEEPALIVE_SECONDS  # события придут по NOTIFY; чтение — лишь подстраховка
+    return pause
+
+
+async def _wait(wake: asyncio.Event, timeout: float) -> None:
+    """Ждёт уведомления о новом событии документа, но не дольше timeout."""
+    try:
+        await asyncio.wait_for(wake.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    wake.clear()
+
+
+def _sse(ev: dict) -> str:
+    data = json.dumps(jsonable_encoder({"criterion": ev["criterion"], **ev["data"]}), ensure_ascii=False)
+    head = f"id: {ev['id']}\n" if ev["id"] else ""
+    return f"{head}event: {ev['kind']}\ndata: {data}\n\n"
+
+
+@router.get("/progress/{doc_id}/stream")
+async def stream_progress(doc_id: int, request: Request, after: int = 0,
+                          user_id: int = Depends(get_current_user_id)):
+    await _check_access(doc_id, user_id)
+    # при переподключении браузер присылает Last-Event-ID — продолжаем с него
+    last_event_id = request.headers.get("last-event-id")
+    start = int(last_event_id) if last_event_id and last_event_id.isdigit() else after
+
+    await progress_hub.start()
+
+    async def _events():
+        last_id = start
+        last_sent = time.monotonic()
+        pause = PROGRESS_POLL_SECONDS
+        # подписка до первого чтения: событие между чтением и ожиданием не теряется
+        wake = progress_hub.subscribe(doc_id)
+        try:
+            yield f"retry: {int(PROGRESS_POLL_SECONDS * 4000)}\n\n"
+            while not await request.is_disconnected():
+                events, finished = await _fetch(doc_id, last_id)
+                for ev in events:
+                    yield _sse(ev)
+                    last_id = max(last_id, ev["id"])
+                if finished:
+                    return
+                if events:
+                    last_sent = time.monotonic()
+                    pause = PROGRESS_POLL_SECONDS
+                elif time.monotonic() - last_sent >= PROGRESS_KEEPALIVE_SECONDS:
+                    # комментарий SSE: не даёт прокси закрыть «молчащее» соединение
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                await _wait(wake, min(_wait_seconds(pause), PROGRESS_KEEPALIVE_SECONDS))
+                pause = min(pause * 2, PROGRESS_POLL_MAX_SECONDS)
+        finally:
+            progress_hub.unsubscribe(doc_id, wake)
+
+    return StreamingResponse(_events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: не буферизовать поток
+    })
+
+
+@router.get("/progress/{doc_id}")
+async def poll_progress(doc_id: int, request: Request, after: int = 0, timeout: float = 25.0,
+                        user_id: int = Depends(get_current_user_id)):
+    """Long-poll: отвечает, как только появились события после after (или по таймауту — пустым списком)."""
+    await _check_access(doc_id, user_id)
+    await progress_hub.start()
+    deadline = time.monotonic() + max(0.0, min(timeout, PROGRESS_LONGPOLL_MAX_SECONDS))
+    pause = PROGRESS_POLL_SECONDS
+    wake = progress_hub.subscribe(doc_id)
+    try:
+        while True:
+            events, finished = await _fetch(doc_id, after)
+            if events or finished or time.monotonic() >= deadline or await request.is_disconnected():
+                break
+            await _wait(wake, min(_wait_seconds(pause), deadline - time.monotonic()))
+            pause = min(pause * 2, PROGRESS_POLL_MAX_SECONDS)
+    finally:
+        progress_hub.unsubscribe(doc_id, wake)
+    last_id = max([after] + [ev["id"] for ev in events])
+    return {"events": events, "last_id": last_id, "finished": finished}
@@ -1,40 +1,63 @@
-import os
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from scripts.db import get_db
-from scripts.crud import get_document, get_user_by_login
-from routers.dependencies import get_current_user
-from scripts.parse_report import parse_report
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import (
+    get_criterion_results, get_document, get_document_summary, get_latest_job,
+)
+from routers.dependencies import get_current_user_id
+from scripts.analysis.main import CRITERIA_VERSIONS
+import json
 
 router = APIRouter()
 
+
+async def _criteria_status(db: AsyncSession, doc_id: int) -> dict:
+    """Статус каждого критерия: done — итог уже сохранён воркером, pending — ещё считается."""
+    done = {row.criterion: row for row in await get_criterion_results(db, doc_id)}
+    criteria = {}
+    for name in sorted(CRITERIA_VERSIONS):
+        row = done.get(name)
+        if row is None:
+            criteria[name] = {"status": "pending"}
+            continue
+        violations = json.loads(row.violations) if row.violations else []
+        criteria[name] = {
+            "status": "done",
+            "ok": row.ok,
+            "comment": row.comment,
+            "violation_count": len(violations),
+            "violations": violations,
+            "seconds": row.seconds,
+        }
+    return criteria
+
+
 @router.get("/result/{doc_id}")
-def get_result(doc_id: int, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
-    user = get_user_by_login(db, current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    doc = get_document(db, doc_id)
-    if not doc or doc.user_id != user.id:
+async def get_result(doc_id: int, db: AsyncSession = Depends(get_async_db), user_id: int = Depends(get_current_user_id)):
+    doc = await get_document(db, doc_id)
+    if not doc or doc.user_id != user_id:
         raise HTTPException(status_code=404, detail="Document not found")
     
     if doc.ann_pdf_path is None or doc.description is None:
-        return {"id": doc.id, "status": "processing"}
+        job = await get_latest_job(db, doc.id)
+        if job is not None and job.status == "failed":
+            return {"id": doc.id, "status": "error", "detail": "Анализ не выполнен",
+                    "criteria": await _criteria_status(db, doc.id)}
+        # частичный результат: готовые критерии видны, пока остальные (LLM) ещё считаются
+        return {"id": doc.id, "status": "processing", "criteria": await _criteria_status(db, doc.id)}
     
-    report_path = doc.description
-    if not os.path.exists(report_path):
+    report = await get_document_summary(db, doc, with_report=True)
+    if report is None:
         raise HTTPException(status_code=404, detail="Report file not found")
-    
-    with open(report_path, "r", encoding="utf-8") as f:
-        report_content = f.read()
-    
-    parsed_data = parse_report(report_content)
-    
+
     return {
         "id": doc.id,
         "filename": doc.filename,
         "upload_date": doc.upload_date,
-        "error_points": parsed_data["error_points"],
-        "error_counts": parsed_data["error_counts"],
-        "total_violations": parsed_data["total_violations"],
-        "full_report": parsed_data["full_report"]
+        "error_points": report["error_points"],
+        "error_counts": report["error_counts"],
+        "total_violations": report["total_violations"],
+        "full_report": report["full_report"],
+        "violations": json.loads(doc.violations) if doc.violations else None,
+        "criteria": await _criteria_status(db, doc.id),
     }
\ No newline at end of file
@@ -0,0 +1,38 @@
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import get_document
+from scripts.analysis.tiles import TILE_VERSION, get_tile, tile_source_id
+from routers.dependencies import get_current_user_id
+from routers.file_responses import CACHE_IMMUTABLE, bytes_response, etag_not_modified
+
+router = APIRouter()
+
+@router.api_route("/documents/{doc_id}/pages/{page}/tiles/{z}/{x}/{y}.png", methods=["GET", "HEAD"])
+async def get_page_tile(doc_id: int, page: int, z: int, x: int, y: int, request: Request,
+                        db: AsyncSession = Depends(get_async_db),
+                        user_id: int = Depends(get_current_user_id)):
+    """
+    Плитка превью листа page (с 1): на z=0 весь лист — одна плитка 256 px по длинной стороне,
+    на каждом следующем уровне вдвое больше (см. scripts/analysis/tiles.py). Крайние плитки меньше 256 px.
+    """
+    doc = await get_document(db, doc_id)
+    if not doc or doc.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Document not found")
+    file_path = os.path.join("data", "original", str(doc_id), doc.filename)
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    source_id = tile_source_id(doc.id, doc.content_hash)
+    # mtime плитки меняется при каждом обращении (LRU) — ETag по координатам, а не по файлу;
+    # у клиента плитка уже есть — кэш не трогаем
+    etag = f'"{source_id}-v{TILE_VERSION}-{page}-{z}-{x}-{y}"'
+    if etag_not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_IMMUTABLE})
+    # PNG целиком в памяти (плитки небольшие): вытеснение из кэша другим процессом не оборвёт ответ
+    data = await asyncio.to_thread(get_tile, file_path, source_id, page, z, x, y)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return bytes_response(request, data, etag, cache_control=CACHE_IMMUTABLE, media_type="image/png")
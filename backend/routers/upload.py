@@ -1,37 +1,132 @@
 # routers/upload.py
-from fastapi import APIRouter, UploadFile, File, Depends, BackgroundTasks, HTTPException
-from sqlalchemy.orm import Session
-from scripts.db import get_db
-from scripts.crud import create_document, get_user_by_login
-from scripts.analysis.main import make_report_files
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.db import get_async_db
+from scripts.async_crud import (
+    create_document, get_document, set_document_content_hash, enqueue_job,
+    find_analyzed_document, update_document_analysis, copy_criterion_results, get_document_summary,
+)
+from scripts.analysis.main import ANALYZER_VERSION, retitle_report
+from scripts.analysis.criterion_1_1_1 import get_config
 from datetime import datetime
+from typing import Optional
+import asyncio
+import hashlib
+import json
 import os
-import shutil
+import uuid
 
-from routers.dependencies import get_current_user
+from routers.dependencies import get_current_user_id
 
 router = APIRouter()
 
+CHUNK_SIZE = 1024 * 1024
+# предел размера загружаемого PDF (МБ); тот же предел проверяется по Content-Length в app.py
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# заголовок «%PDF-» может идти не с первого байта, но в пределах первых 1024
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+INCOMING_DIR = os.path.join("data", "original", ".incoming")
+
+
+async def _save_and_hash(upload: UploadFile, file_path: str) -> str:
+    """
+    Пишет загрузку на диск блоками, не блокируя цикл событий: чтение — await upload.read,
+    запись — в потоке. Попутно считает sha256, проверяет заголовок PDF и предел размера.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    with open(file_path, "wb") as buffer:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_MB} MB")
+            if len(head) < PDF_HEADER_WINDOW:
+                head += chunk[:PDF_HEADER_WINDOW - len(head)]
+                if len(head) >= PDF_HEADER_WINDOW and PDF_MAGIC not in head:
+                    raise HTTPException(status_code=415, detail="File is not a PDF")
+            digest.update(chunk)
+            await asyncio.to_thread(buffer.write, chunk)
+    if PDF_MAGIC not in head:
+        raise HTTPException(status_code=415, detail="File is not a PDF")
+    return digest.hexdigest()
+
+
+def _link_original(existing_path: str, file_path: str):
+    """Заменяет только что записанную копию жёсткой ссылкой на уже хранящийся оригинал (экономия места)."""
+    if not os.path.exists(existing_path):
+        return
+    tmp_path = file_path + ".link"
+    try:
+        os.link(existing_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        # другая ФС или нет поддержки ссылок — оставляем копию
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
 @router.post("/upload")
 async def upload_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: str = Depends(get_current_user)):
-    user = get_user_by_login(db, current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    revision_of: Optional[int] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)):
+
+    # revision_of — id предыдущей версии чертежа этого же пользователя
+    if revision_of is not None:
+        parent = await get_document(db, revision_of)
+        if not parent or parent.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+    # сначала принимаем и проверяем файл во временный путь: отклонённая загрузка не оставляет записи в БД
+    filename = os.path.basename(file.filename or "") or "document.pdf"
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    incoming_path = os.path.join(INCOMING_DIR, uuid.uuid4().hex)
+    try:
+        content_hash = await _save_and_hash(file, incoming_path)
+    except BaseException:
+        if os.path.exists(incoming_path):
+            os.remove(incoming_path)
+        raise
+
     upload_date = datetime.now()
-    doc = create_document(db, user.id, file.filename, upload_date)
-    
+    doc = await create_document(db, user_id, filename, upload_date, parent_id=revision_of)
+
     doc_dir = f"data/original/{doc.id}"
     os.makedirs(doc_dir, exist_ok=True)
-    
-    file_path = f"{doc_dir}/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    background_tasks.add_task(make_report_files, file_path, doc.id)
-    
-    return {"id": doc.id, "filename": file.filename, "upload_date": upload_date}
\ No newline at end of file
+
+    # переименование в пределах одной ФС — без второго копирования; воркер получает путь к этому файлу
+    file_path = f"{doc_dir}/{filename}"
+    os.replace(incoming_path, file_path)
+    await set_document_content_hash(db, doc.id, content_hash)
+
+    # Тот же PDF этот пользователь уже анализировал с той же конфигурацией и версией — берём готовые отчёты
+    prev = await find_analyzed_document(db, user_id, content_hash, get_config().hash, ANALYZER_VERSION,
+                                        exclude_id=doc.id)
+    if prev is not None:
+        await asyncio.to_thread(_link_original, os.path.join("data", "original", str(prev.id), prev.filename), file_path)
+        # текст реестра — свой у каждого документа: в заголовке имя этого файла, а не прежнего
+        summary = await get_document_summary(db, prev, with_report=True)
+        report_text = retitle_report(summary["full_report"], filename) if summary else None
+        await update_document_analysis(db, doc.id, prev.ann_pdf_path, prev.description,
+                                       config_hash=prev.config_hash, analyzer_version=prev.analyzer_version,
+                                       page_fingerprints=json.loads(prev.page_fingerprints) if prev.page_fingerprints else None,
+                                       summary=summary,
+                                       violations=json.loads(prev.violations) if prev.violations else None,
+                                       report_text=report_text,
+                                       page_sizes=json.loads(prev.page_sizes) if prev.page_sizes else None)
+        await copy_criterion_results(db, prev.id, doc.id)
+        return {"id": doc.id, "filename": filename, "upload_date": upload_date,
+                "parent_id": revision_of, "reused": True}
+
+    # анализ выполняет отдельный процесс воркера (worker.py) — API его не ждёт и не грузит CPU
+    await enqueue_job(db, doc.id, file_path)
+
+    return {"id": doc.id, "filename": filename, "upload_date": upload_date,
+            "parent_id": revision_of, "reused": False}
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List
+import fitz  # PyMuPDF
+
+# =========================
+# Аннотированный PDF: строится по запросу и хранится на диске
+# =========================
+# Анализ сохраняет только нарушения (Document.violations); PDF с обводкой рисуется при первом
+# /download_annotated. Копия оригинала дописывается инкрементально (новые объекты — только у листов
+# с нарушениями) вместо полной пересборки документа. Рядом лежит ключ «<файл>.key»: если нарушения,
+# исходный PDF или способ отрисовки изменились, файл строится заново.
+# Те же кластеры отдаются клиенту JSON'ом (/overlay) вместе с размерами листов — он рисует рамки сам.
+
+# менять при изменении отрисовки — старые файлы перестроятся
+ANNOTATION_VERSION = "1"
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _path_lock(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def annotation_key(source_id: str, violations: List[Dict[str, Any]]) -> str:
+    """Ключ содержимого аннотированного PDF: исходный файл + номера, листы, рамки и пункты нарушений."""
+    h = hashlib.sha256()
+    h.update(ANNOTATION_VERSION.encode())
+    h.update((source_id or "").encode())
+    marks = [(v["num"], v["page"], [float(x) for x in v["bbox"]], list(v["criteria"])) for v in violations]
+    h.update(json.dumps(marks, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def page_sizes(doc: fitz.Document) -> List[List[float]]:
+    """
+    [ширина, высота, поворот] каждого листа. Размеры — без учёта поворота, в пунктах:
+    в этих же координатах (от левого верхнего угла) записаны bbox нарушений.
+    """
+    sizes = []
+    for page in doc:
+        box = page.cropbox
+        sizes.append([round(box.width, 2), round(box.height, 2), int(page.rotation or 0)])
+    return sizes
+
+
+def read_page_sizes(pdf_path: str) -> List[List[float]]:
+    """page_sizes по пути к PDF — для документов, проанализированных до их сохранения в БД."""
+    with fitz.open(pdf_path) as doc:
+        return page_sizes(doc)
+
+
+def draw_violations(doc: fitz.Document, violations: List[Dict[str, Any]]) -> None:
+    """Рамки и подписи «No N: n.<пункты>» — только на листах с нарушениями."""
+    for v in violations:
+        r = fitz.Rect(*v["bbox"])
+        label = f"No {v['num']}: n." + ", ".join(v["criteria"])
+        page = doc[v["page"] - 1]
+        # толще рамка и крупнее шрифт
+        page.draw_rect(r, color=(1, 0, 0), width=2.2)
+        y_text = r.y0 - 14 if r.y0 >= 18 else (r.y0 + 14)
+        page.insert_text((r.x0, y_text), label, fontsize=20, color=(1, 0, 0))
+
+
+def render_annotated(src_path: str, violations: List[Dict[str, Any]], out_path: str) -> str:
+    """
+    Копирует оригинал и дописывает обводку инкрементальным сохранением; если инкрементально
+    нельзя (повреждённый/зашифрованный PDF и т.п.) — полное сохранение. Файл заменяется атомарно.
+    """
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    full_path = tmp_path + ".full"
+    shutil.copyfile(src_path, tmp_path)
+    try:
+        doc = fitz.open(tmp_path)
+        try:
+            draw_violations(doc, violations)
+            if doc.can_save_incrementally():
+                doc.saveIncr()
+                result_path = tmp_path
+            else:
+                doc.save(full_path)
+                result_path = full_path
+        finally:
+            doc.close()
+        os.replace(result_path, out_path)
+    finally:
+        for p in (tmp_path, full_path):
+            if os.path.exists(p):
+                os.remove(p)
+    return out_path
+
+
+def ensure_annotated(src_path: str, violations: List[Dict[str, Any]], out_path: str, source_id: str) -> str:
+    """Готовый аннотированный PDF: из кэша на диске, если ключ совпадает, иначе строится заново."""
+    key = annotation_key(source_id, violations)
+    key_path = out_path + ".key"
+    with _path_lock(out_path):
+        if os.path.exists(out_path) and os.path.exists(key_path):
+            with open(key_path, "r", encoding="utf-8") as f:
+                if f.read().strip() == key:
+                    return out_path
+        render_annotated(src_path, violations, out_path)
+        with open(key_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(key_path + ".tmp", key_path)
+    return out_path
@@ -0,0 +1,115 @@
+import random
+import time
+from typing import Any, Dict, List
+import fitz  # PyMuPDF
+from scripts.analysis.main import _iou, _rect_distance, merge_violations
+
+# =========================
+# Бенчмарк merge_violations на синтетических bbox
+# =========================
+# Запуск из backend/:  python -m scripts.analysis.bench_merge_violations -n 10000 --pages 2
+
+A1_W, A1_H = 2384.0, 1684.0  # лист A1 в pt
+
+
+def synthetic_violations(n: int, pages: int = 1, seed: int = 0, centres: int = 40,
+                         spread: float = 15.0, scatter: float = 0.05) -> List[Dict[str, Any]]:
+    """
+    n мелких «размерных» bbox на страницу, как у густо образмеренных чертежей (1.1.5/1.1.6):
+    большая часть — сгустки у узлов чертежа (нормальное распределение, σ = spread pt, вокруг centres центров),
+    доля scatter — отдельные надписи по всему листу.
+    Целиком равномерные тысячи bbox на листе сцепляются в один кластер — такой замер ничего не говорит.
+    """
+    rnd = random.Random(seed)
+    out = []
+    for page in range(1, pages + 1):
+        nodes = [(rnd.uniform(0, A1_W), rnd.uniform(0, A1_H)) for _ in range(max(1, centres))]
+        for i in range(n):
+            if rnd.random() < scatter:
+                x = rnd.uniform(0, A1_W)
+                y = rnd.uniform(0, A1_H)
+            else:
+                cx, cy = rnd.choice(nodes)
+                x = min(max(rnd.gauss(cx, spread), 0.0), A1_W)
+                y = min(max(rnd.gauss(cy, spread), 0.0), A1_H)
+            w = rnd.uniform(5, 40)
+            h = rnd.uniform(3, 12)
+            crit = rnd.choice(("1.1.5", "1.1.6", "1.1.3", "1.1.4"))
+            text = f"⌀{i % 97}"
+            out.append({
+                "page": page,
+                "bbox": [x, y, x + w, y + h],
+                "criterion": crit,
+                "note": f"({crit}) {text}",
+                "meta": {"text": text} if crit in ("1.1.5", "1.1.6") else {},
+            })
+    return out
+
+
+def _reference_clusters(items: List[Dict[str, Any]], iou_threshold: float, dist_threshold: float):
+    """Исходный полный перебор (до сетки) — эталон для сравнения кластеров."""
+    used = [False] * len(items)
+    for i, v in enumerate(items):
+        if used[i]:
+            continue
+        cluster_rect = fitz.Rect(*v["bbox"])
+        cluster_idx = [i]
+        changed = True
+        while changed:
+            changed = False
+            for j, w in enumerate(items):
+                if used[j] or j in cluster_idx:
+                    continue
+                r2 = fitz.Rect(*w["bbox"])
+                if _iou(cluster_rect, r2) >= iou_threshold or _rect_distance(cluster_rect, r2) < dist_threshold:
+                    cluster_idx.append(j)
+                    cluster_rect = cluster_rect | r2
+                    changed = True
+        for idx in cluster_idx:
+            used[idx] = True
+        yield cluster_idx, cluster_rect
+
+
+def _timed(fn, *args) -> tuple[Any, float]:
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - t0
+
+
+def main():
+    import argparse
+    import scripts.analysis.main as analysis_main
+
+    parser = argparse.ArgumentParser(description="Бенчмарк кластеризации нарушений (merge_violations).")
+    parser.add_argument("-n", type=int, default=10_000, help="bbox на страницу (default: 10000)")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--centres", type=int, default=40, help="центров сгущения bbox на странице (default: 40)")
+    parser.add_argument("--spread", type=float, default=15.0, help="разброс bbox вокруг центра, pt (default: 15)")
+    parser.add_argument("--scatter", type=float, default=0.05,
+                        help="доля bbox, разбросанных по листу равномерно (default: 0.05)")
+    parser.add_argument("--compare", type=int, default=1_000,
+                        help="сравнить с полным перебором на стольких bbox на страницу (0 — пропустить)")
+    args = parser.parse_args()
+
+    data = synthetic_violations(args.n, args.pages, args.seed, args.centres, args.spread, args.scatter)
+    merged, seconds = _timed(merge_violations, data)
+    print(f"grid: {args.n} bbox × {args.pages} стр. → {len(merged)} кластеров за {seconds:.3f} с")
+
+    if args.compare:
+        small = synthetic_violations(args.compare, args.pages, args.seed, args.centres, args.spread, args.scatter)
+        fast, t_fast = _timed(merge_violations, small)
+        original = analysis_main._cluster_page
+        analysis_main._cluster_page = _reference_clusters
+        try:
+            slow, t_slow = _timed(merge_violations, small)
+        finally:
+            analysis_main._cluster_page = original
+        print(f"полный перебор на {args.compare} bbox: {t_slow:.3f} с, сетка: {t_fast:.3f} с, "
+              f"результат {'совпадает' if fast == slow else 'ОТЛИЧАЕТСЯ'}")
+        if fast != slow:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
+import hashlib
 import json
+import os
+import threading
 from pathlib import Path
 import re
-import fitz  # PyMuPDF
 from rich import print
 import yaml
+from scripts.analysis.pdf_cache import DocumentCache, open_document
 
 # =========================
 # Генератор регексов по русскому названию
@@ -58,9 +61,65 @@ def generate_ru_regex(name: str) -> str:
 # Конфиг и компиляция
 # =========================
 
+_DOC_TYPE_MEMO_MAX = 50_000
+# первая основа сгенерированного паттерна: r'\b' + литерал (экранируются только не-буквенные символы) + r'\w*'
+_LEADING_STEM_RE = re.compile(r"^\\b((?:\\[^\w\s]|[^\\\[\](){}|*+?.^$])+)\\w\*")
+_WORD_START_RE = re.compile(r"\b\w", re.UNICODE)
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    """Есть ли в паттерне '|' вне скобок и классов символов (тогда первая основа — лишь одна из ветвей)."""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+            # ']' сразу после '[' или '[^' — обычный символ класса
+            if pattern[i + 1:i + 2] == "^":
+                i += 1
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _leading_stem(pattern: str) -> str | None:
+    """
+    Литерал, с которого (от границы слова) начинается любое совпадение паттерна.
+    None — выделить нельзя (альтернатива на верхнем уровне, другой вид паттерна): такой паттерн проверяется всегда.
+    """
+    if _has_top_level_alternation(pattern):
+        return None
+    m = _LEADING_STEM_RE.match(pattern)
+    if not m:
+        return None
+    stem = re.sub(r"\\(.)", r"\1", m.group(1)).lower()
+    if not re.match(r"\w", stem):
+        return None
+    return stem
+
+
 class CompiledConfig:
     def __init__(self, conf: dict):
         self.conf = conf
+        # хэш содержимого (не текста файла): комментарии и форматирование YAML его не меняют
+        self.hash = hashlib.sha256(
+            json.dumps(conf, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
 
         # 1) код документа
         doc_code_rx = conf.get("doc_code_regex") or r"^[A-ZА-Я0-9]{2,}\.\d{3,}\.\d{3,}[A-ZА-Я0-9-]*$"
@@ -93,11 +152,62 @@ class CompiledConfig:
             rx = regex_overrides.get(name) or generate_ru_regex(name)
             self.DOC_TYPE_PATTERNS[name] = re.compile(rx, re.IGNORECASE | re.UNICODE)
 
+        # 8) основы → имена: паттерн вида r'\bоснова\w*...' совпасть может только там, где с начала слова
+        #    идёт его основа. Основы лежат в префиксном дереве: один проход по словам строки даёт
+        #    кандидатов, и регексы проверяются только у них (плюс у паттернов без выделяемой основы)
+        self._doc_type_order = {name: i for i, name in enumerate(self.DOC_TYPE_PATTERNS)}
+        self._stem_trie: dict = {}
+        self._unstemmed: list[str] = []
+        for name, rx in self.DOC_TYPE_PATTERNS.items():
+            stem = _leading_stem(rx.pattern)
+            if stem is None:
+                self._unstemmed.append(name)
+                continue
+            node = self._stem_trie
+            for ch in stem:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, []).append(name)  # ключ None — имена, чья основа кончается здесь
+        self._doc_type_memo: dict[str, str | None] = {}
+
     # служебные
     def match_doc_type(self, text: str) -> str | None:
+        """
+        Первое (в порядке DOC_TYPE_PATTERNS) имя типа документа, чей паттерн находится в тексте.
+        Результат запоминается по нормализованной строке.
+        """
         s = _norm_text(text)
-        for name, rx in self.DOC_TYPE_PATTERNS.items():
-            if rx.search(s):
+        memo = self._doc_type_memo
+        if s in memo:
+            return memo[s]
+        res = self._match_doc_type_uncached(s)
+        if len(memo) >= _DOC_TYPE_MEMO_MAX:
+            memo.clear()
+        memo[s] = res
+        return res
+
+    def _doc_type_candidates(self, s: str) -> set[str]:
+        """Имена, чья основа встречается в s с начала слова, и все паттерны без основы."""
+        found = set(self._unstemmed)
+        if not self._stem_trie:
+            return found
+        n = len(s)
+        for m in _WORD_START_RE.finditer(s):
+            node = self._stem_trie
+            i = m.start()
+            while i < n:
+                node = node.get(s[i])
+                if node is None:
+                    break
+                names = node.get(None)
+                if names:
+                    found.update(names)
+                i += 1
+        return found
+
+    def _match_doc_type_uncached(self, s: str) -> str | None:
+        # порядок DOC_TYPE_PATTERNS сохраняется: из кандидатов побеждает первый по нему
+        for name in sorted(self._doc_type_candidates(s), key=self._doc_type_order.__getitem__):
+            if self.DOC_TYPE_PATTERNS[name].search(s):
                 return name
         return None
 
@@ -158,13 +268,11 @@ def code_suffix_matches_doc_type(doc_code_text: str, doc_type_text: str | None,
 # Извлечение и фильтрация
 # =========================
 
-def extract_pdf_text_as_dict(pdf_path: str) -> dict:
-    pdf_path = str(pdf_path)
-    doc = fitz.open(pdf_path)
+def extract_pdf_text_as_dict(pdf_path: "str | DocumentCache") -> dict:
     data: dict[int, list[dict]] = {}
-    try:
-        for page_index, page in enumerate(doc, start=1):
-            page_dict = page.get_text("dict")
+    with open_document(pdf_path) as doc:
+        for pc in doc:
+            page_dict = pc.text_dict()
             items = []
             for block in page_dict.get("blocks", []):
                 if block.get("type", 0) != 0:
@@ -182,9 +290,7 @@ def extract_pdf_text_as_dict(pdf_path: str) -> dict:
                             "size": round(float(span.get("size", 0.0)), 2),
                         })
             items.sort(key=lambda it: (it["bbox"][1], it["bbox"][0]))
-            data[page_index] = items
-    finally:
-        doc.close()
+            data[pc.number] = items
     return data
 
 def filter_titleblock_items(extracted: dict, cc: CompiledConfig) -> dict:
@@ -199,10 +305,10 @@ def filter_titleblock_items(extracted: dict, cc: CompiledConfig) -> dict:
         # код
         code_items = [it for it in items if cc.DOC_CODE_RE.match(it.get('text', ''))]
 
-        # тип документа
+        # тип документа: один поиск на элемент, дальше используем готовый результат
+        doc_types = [cc.match_doc_type(it.get('text', '')) for it in items]
         doc_type_items = []
-        for it in items:
-            name = cc.match_doc_type(it.get('text', ''))
+        for it, name in zip(items, doc_types):
             if name:
                 it2 = dict(it)
                 it2["doc_type_name"] = name
@@ -214,17 +320,17 @@ def filter_titleblock_items(extracted: dict, cc: CompiledConfig) -> dict:
             anchor = max(doc_type_items, key=lambda it: (it.get('size', 0), -it['bbox'][1]))
             y0 = anchor['bbox'][1]
             name_candidates = [
-                it for it in items
+                it for it, name in zip(items, doc_types)
                 if it.get('size', 0) >= cc.name_min_font_size
                 and not any(ch.isdigit() for ch in it.get('text', ''))
-                and cc.match_doc_type(it.get('text', '')) is None
+                and name is None
                 and (y0 - cc.name_y_window) <= it['bbox'][1] <= (y0 + cc.name_y_window)
             ]
         if not name_candidates:
             only_words = [
-                it for it in items
+                it for it, name in zip(items, doc_types)
                 if not any(ch.isdigit() for ch in it.get('text', ''))
-                and cc.match_doc_type(it.get('text', '')) is None
+                and name is None
             ]
             name_candidates = sorted(only_words, key=lambda it: it.get('size', 0), reverse=True)[:3]
 
@@ -264,10 +370,42 @@ def filter_titleblock_items(extracted: dict, cc: CompiledConfig) -> dict:
 # CLI
 # =========================
 
+DEFAULT_CONFIG_PATH = str(Path(__file__).with_name("config.yaml"))
+
 def load_config(path: str) -> CompiledConfig:
     cfg = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
     return CompiledConfig(cfg)
 
+
+# Скомпилированный конфиг на процесс: {путь: ((mtime_ns, size), CompiledConfig)}
+_config_cache: dict[str, tuple[tuple[int, int], CompiledConfig]] = {}
+_config_lock = threading.Lock()
+
+def get_config(path: str = DEFAULT_CONFIG_PATH) -> CompiledConfig:
+    """
+    Общий для всех задач CompiledConfig. Перечитывается только при изменении файла
+    (mtime/размер); подмена в кэше атомарна — задачи дочитывают тот экземпляр, который получили.
+    Если новая версия YAML не парсится, остаётся предыдущая (и попытка повторится при следующем вызове).
+    """
+    key_path = os.path.abspath(path)
+    st = os.stat(key_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _config_cache.get(key_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _config_lock:
+        cached = _config_cache.get(key_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            cc = load_config(key_path)
+        except Exception:
+            if cached is not None:
+                return cached[1]
+            raise
+        _config_cache[key_path] = (stamp, cc)
+        return cc
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Extract text from a PDF drawing into a Python dict using PyMuPDF (configurable via YAML).")
@@ -1,7 +1,8 @@
 import json
-import re
 from pathlib import Path
 import fitz  # PyMuPDF
+from scripts.analysis.pdf_cache import DocumentCache, open_document
+from scripts.analysis.layout import page_layout
 
 PT_PER_INCH = 72.0
 MM_PER_INCH = 25.4
@@ -15,75 +16,6 @@ ABOVE_GAP_TOL_PT = 1.5 * PT_PER_MM  # small gap tolerance (~1.5 mm)
 COL_X_CLUSTER_PT = 14 * PT_PER_MM   # x0 distance to cluster lines into columns (~14 mm)
 ALIGNMENT_MIN_OVERLAP_RATIO = 0.3   # overlap ratio to consider "aligned above title block"
 
-TB_KEYWORDS = [
-    "Масштаб", "Масса", "Лит", "Разраб", "Пров", "Т.контр", "Н.контр",
-    "Утв", "Лист", "Листов", "Изм.", "№ докум", "Подп.", "Дата"
-]
-
-
-def _page_lines_with_bbox(page):
-    pd = page.get_text("dict")
-    out = []
-    for block in pd.get("blocks", []):
-        if block.get("type", 0) != 0:
-            continue
-        for line in block.get("lines", []):
-            spans = line.get("spans", [])
-            if not spans:
-                continue
-            text = "".join((s.get("text") or "") for s in spans).strip()
-            if not text:
-                continue
-            x0s = [float(s["bbox"][0]) for s in spans]
-            y0s = [float(s["bbox"][1]) for s in spans]
-            x1s = [float(s["bbox"][2]) for s in spans]
-            y1s = [float(s["bbox"][3]) for s in spans]
-            bbox = [min(x0s), min(y0s), max(x1s), max(y1s)]
-            size = max(float(s.get("size", 0.0)) for s in spans)
-            out.append({"text": text, "bbox": bbox, "size": size})
-    out.sort(key=lambda it: (it["bbox"][1], it["bbox"][0]))
-    return out
-
-
-def _split_tt_and_field(lines):
-    tt = []
-    field = []
-    for it in lines:
-        t = it["text"]
-        if re.match(r"^\s*\d+\s*[.)-]?\s+", t):
-            tt.append(it)
-        else:
-            field.append(it)
-    return tt, field
-
-
-def _find_title_block_bbox(lines, page_rect):
-    matches = []
-    for it in lines:
-        low = it["text"].lower().replace("ё", "е")
-        if any(k.lower() in low for k in TB_KEYWORDS):
-            matches.append(it)
-
-    if len(matches) >= 2:
-        x0 = min(it["bbox"][0] for it in matches)
-        y0 = min(it["bbox"][1] for it in matches)
-        x1 = max(it["bbox"][2] for it in matches)
-        y1 = max(it["bbox"][3] for it in matches)
-        return matches, fitz.Rect(x0, y0, x1, y1), "keywords"
-
-    # Fallback: bottom-right zone text union
-    w, h = page_rect.width, page_rect.height
-    br_matches = [it for it in lines if it["bbox"][0] > 0.6 * w and it["bbox"][1] > 0.6 * h]
-    if not br_matches:
-        br_matches = [it for it in lines if it["bbox"][0] > 0.5 * w and it["bbox"][1] > 0.7 * h]
-    if br_matches:
-        x0 = min(it["bbox"][0] for it in br_matches)
-        y0 = min(it["bbox"][1] for it in br_matches)
-        x1 = max(it["bbox"][2] for it in br_matches)
-        y1 = max(it["bbox"][3] for it in br_matches)
-        return br_matches, fitz.Rect(x0, y0, x1, y1), "bottom-right"
-    return [], fitz.Rect(0, page_rect.height - 50, page_rect.width, page_rect.height), "default-bottom-strip"
-
 
 def _cluster_columns(tt_lines):
     if not tt_lines:
@@ -123,21 +55,19 @@ def _overlap_ratio(a, b):
     return float(inter_w / base)
 
 
-def check_tt_position_and_width(pdf_path: str) -> dict:
-    doc = fitz.open(pdf_path)
+def check_tt_position_and_width(pdf_path: "str | DocumentCache") -> dict:
     report = {"pages": {}, "ok": True}
-    try:
-        for pageno, page in enumerate(doc, start=1):
-            page_rect = page.rect
+    with open_document(pdf_path) as doc:
+        for pc in doc:
+            pageno = pc.number
+            page_rect = pc.rect
             page_w_mm = page_rect.width * MM_PER_PT
             page_h_mm = page_rect.height * MM_PER_PT
 
-            lines = _page_lines_with_bbox(page)
-            tt_lines, field_lines = _split_tt_and_field(lines)
-
-            tb_matches, tb_bbox, tb_method = _find_title_block_bbox(lines, page_rect)
+            layout = page_layout(pc)
+            tb_matches, tb_bbox, tb_method = layout.tb_matches, layout.tb_bbox, layout.tb_method
 
-            cols = _cluster_columns(tt_lines)
+            cols = _cluster_columns(layout.tt_lines)
             cols_bboxes = [_column_bbox(c) for c in cols]
 
             page_info = {
@@ -196,6 +126,11 @@ def check_tt_position_and_width(pdf_path: str) -> dict:
                 report["ok"] = False
 
             page_info["tt_columns"] = widths_details
+            # общий прямоугольник ТТ — по нему collect_violations исключает ТТ из обводок 1.1.3/1.1.4
+            page_info["tt_bbox_pt"] = (
+                [tt_union.x0, tt_union.y0, tt_union.x1, tt_union.y1]
+                if cols_bboxes else None
+            )
             page_info["placement"] = {
                 "tt_found": bool(cols_bboxes),
                 "above_title_block_ok": bool(above_ok),
@@ -204,18 +139,16 @@ def check_tt_position_and_width(pdf_path: str) -> dict:
                 "page_ok": bool(page_ok),
             }
             report["pages"][pageno] = page_info
-    finally:
-        doc.close()
     return report
 
 
 # >>> НОВОЕ: импортируемая обёртка, возвращающая JSON-строку <<<
-def run_check(pdf_path: str) -> dict:
+def run_check(pdf_path: "str | DocumentCache") -> dict:
     """
     Запускает проверку и возвращает JSON-строку ровно в том виде,
     как она раньше печаталась в stdout.
     """
-    if not Path(pdf_path).exists():
+    if not isinstance(pdf_path, DocumentCache) and not Path(pdf_path).exists():
         raise FileNotFoundError(f"Файл не найден: {pdf_path}")
     res = check_tt_position_and_width(pdf_path)
     return res
@@ -1,7 +1,8 @@
 import json
 import re
 from pathlib import Path
-import fitz  # PyMuPDF
+from scripts.analysis.pdf_cache import DocumentCache, open_document
+from scripts.analysis.layout import page_layout, split_tt_and_field
 
 # =========================
 # Нормализация букв (латиница -> кириллица)
@@ -77,40 +78,17 @@ def _extract_letters_from_field(lines: list[dict]) -> list[str]:
 # Извлечение текста с координатами
 # =========================
 
-def extract_lines_with_bbox(pdf_path: str) -> dict[int, list[dict]]:
+def extract_lines_with_bbox(pdf_path: "str | DocumentCache") -> dict[int, list[dict]]:
     """
     Возвращает {page_index: [ {text, bbox, size}, ... ] }
     """
-    doc = fitz.open(pdf_path)
     pages: dict[int, list[dict]] = {}
-    try:
-        for i, page in enumerate(doc, start=1):
-            pd = page.get_text("dict")
-            lines_out = []
-            for block in pd.get("blocks", []):
-                if block.get("type", 0) != 0:
-                    continue
-                for line in block.get("lines", []):
-                    spans = line.get("spans", [])
-                    if not spans:
-                        continue
-                    text = "".join((s.get("text") or "") for s in spans).strip()
-                    if not text:
-                        continue
-                    x0s = [float(s["bbox"][0]) for s in spans]
-                    y0s = [float(s["bbox"][1]) for s in spans]
-                    x1s = [float(s["bbox"][2]) for s in spans]
-                    y1s = [float(s["bbox"][3]) for s in spans]
-                    bbox = [
-                        round(min(x0s), 2), round(min(y0s), 2),
-                        round(max(x1s), 2), round(max(y1s), 2)
-                    ]
-                    size = max(float(s.get("size", 0)) for s in spans)
-                    lines_out.append({"text": text, "bbox": bbox, "size": round(size, 2)})
-            lines_out.sort(key=lambda it: (it["bbox"][1], it["bbox"][0]))
-            pages[i] = lines_out
-    finally:
-        doc.close()
+    with open_document(pdf_path) as doc:
+        for pc in doc:
+            pages[pc.number] = [
+                {"text": it["text"], "bbox": [round(v, 2) for v in it["bbox"]], "size": round(it["size"], 2)}
+                for it in page_layout(pc).lines
+            ]
     return pages
 
 
@@ -124,26 +102,19 @@ def split_into_tt_and_field(lines: list[dict]) -> tuple[list[dict], list[dict]]:
       - ТТ: только строки, начинающиеся с номера ("1 ", "2.", "3)").
       - Поле: все остальные строки.
     """
-    tt_lines = []
-    field_lines = []
-    for it in lines:
-        t = it["text"].strip()
-        if re.match(r"^\s*\d+\s*[.)-]?\s+", t):
-            tt_lines.append(it)
-        else:
-            field_lines.append(it)
-    return tt_lines, field_lines
+    return split_tt_and_field(lines)
 
 
 # =========================
 # Основная проверка
 # =========================
 
-def check_letter_designations(pdf_path: str) -> dict:
-    pages = extract_lines_with_bbox(pdf_path)
+def check_letter_designations(pdf_path: "str | DocumentCache") -> dict:
+    with open_document(pdf_path) as doc:
+        layouts = {pc.number: page_layout(pc) for pc in doc}
     report = {"pages": {}, "ok": True}
-    for pageno, lines in pages.items():
-        tt_lines, field_lines = split_into_tt_and_field(lines)
+    for pageno, layout in layouts.items():
+        tt_lines, field_lines = layout.tt_lines, layout.field_lines
 
         # буквы из ТТ
         tt_letters: list[str] = []
@@ -1,33 +1,16 @@
 import json
 import re
 from pathlib import Path
-import fitz  # PyMuPDF
+from scripts.analysis.pdf_cache import DocumentCache, open_document
+from scripts.analysis.layout import is_tt_line, page_layout
 
 
-def extract_lines_with_bbox(pdf_path: str) -> dict[int, list[str]]:
+def extract_lines_with_bbox(pdf_path: "str | DocumentCache") -> dict[int, list[str]]:
     """
     Возвращает {page_index: [строки текста]}.
     """
-    doc = fitz.open(pdf_path)
-    pages: dict[int, list[str]] = {}
-    try:
-        for i, page in enumerate(doc, start=1):
-            pd = page.get_text("dict")
-            lines_out = []
-            for block in pd.get("blocks", []):
-                if block.get("type", 0) != 0:
-                    continue
-                for line in block.get("lines", []):
-                    spans = line.get("spans", [])
-                    if not spans:
-                        continue
-                    text = "".join((s.get("text") or "") for s in spans).strip()
-                    if text:
-                        lines_out.append(text)
-            pages[i] = lines_out
-    finally:
-        doc.close()
-    return pages
+    with open_document(pdf_path) as doc:
+        return {pc.number: [it["text"] for it in page_layout(pc).lines] for pc in doc}
 
 
 def _extract_stars(text: str) -> list[str]:
@@ -46,19 +29,21 @@ def split_into_tt_and_field(lines: list[str]) -> tuple[list[str], list[str]]:
     tt_lines = []
     field_lines = []
     for t in lines:
-        if re.match(r"^\s*\d+\s*[.)-]\s+", t) or re.match(r"^\s*\d+\s+", t):
+        if is_tt_line(t):
             tt_lines.append(t)
         else:
             field_lines.append(t)
     return tt_lines, field_lines
 
 
-def check_stars(pdf_path: str) -> dict:
-    pages = extract_lines_with_bbox(pdf_path)
+def check_stars(pdf_path: "str | DocumentCache") -> dict:
+    with open_document(pdf_path) as doc:
+        layouts = {pc.number: page_layout(pc) for pc in doc}
     report = {"pages": {}, "ok": True}
 
-    for pageno, lines in pages.items():
-        tt_lines, field_lines = split_into_tt_and_field(lines)
+    for pageno, layout in layouts.items():
+        tt_lines = [it["text"] for it in layout.tt_lines]
+        field_lines = [it["text"] for it in layout.field_lines]
 
         tt_stars = sorted(set(st for line in tt_lines for st in _extract_stars(line)))
         field_stars = sorted(set(st for line in field_lines for st in _extract_stars(line)))
@@ -1,7 +1,8 @@
 import json
 import re
 from pathlib import Path
-import fitz  # PyMuPDF
+from scripts.analysis.pdf_cache import DocumentCache, open_document
+from scripts.analysis.layout import page_layout
 
 # ------------------------
 # Константы и перевод единиц
@@ -37,38 +38,9 @@ RE_FRAME_TAIL = re.compile(r"\b\d{1,2}[.,]\d{1,3}\s+([А-Я]{1,2})\s*$")
 # ------------------------
 # Вытягивание строк с bbox
 # ------------------------
-def _page_lines_with_bbox(page) -> list[dict]:
-    pd = page.get_text("dict")
-    raw_spans = []
-    for block in pd["blocks"]:
-        if block["type"] != 0:
-            continue
-        for line in block["lines"]:
-            for span in line["spans"]:
-                txt = span["text"].strip()
-                if not txt:
-                    continue
-                x0, y0, x1, y1 = span["bbox"]
-                raw_spans.append({"text": txt, "bbox": (x0, y0, x1, y1)})
-
-    # группировка спанов по строкам (Y)
-    rows = []
-    for sp in sorted(raw_spans, key=lambda it: (it["bbox"][1], it["bbox"][0])):
-        placed = False
-        cy = (sp["bbox"][1] + sp["bbox"][3]) / 2
-        for row in rows:
-            rcy = (row["bbox"][1] + row["bbox"][3]) / 2
-            if abs(cy - rcy) < 3:  # допуск по Y ~3pt
-                row["text"] += " " + sp["text"]
-                x0, y0, x1, y1 = row["bbox"]
-                sx0, sy0, sx1, sy1 = sp["bbox"]
-                row["bbox"] = (min(x0, sx0), min(y0, sy0),
-                               max(x1, sx1), max(y1, sy1))
-                placed = True
-                break
-        if not placed:
-            rows.append({"text": sp["text"], "bbox": sp["bbox"]})
-    return rows
+def _page_lines_with_bbox(pc) -> list[dict]:
+    # ряды спанов (склейка по Y) считаются один раз в общей раскладке страницы
+    return page_layout(pc).rows
 
 # ------------------------
 # Поиск баз и букв в рамках
@@ -120,12 +92,12 @@ def _extract_frame_letters(lines: list[dict]) -> list[str]:
 # ------------------------
 # Основная проверка
 # ------------------------
-def check_bases_vs_frames(pdf_path: str) -> dict:
-    doc = fitz.open(pdf_path)
+def check_bases_vs_frames(pdf_path: "str | DocumentCache") -> dict:
     report = {"pages": {}, "ok": True}
-    try:
-        for pageno, page in enumerate(doc, start=1):
-            lines = _page_lines_with_bbox(page)
+    with open_document(pdf_path) as doc:
+        for pc in doc:
+            pageno = pc.number
+            lines = _page_lines_with_bbox(pc)
 
             bases_set  = sorted(set(_extract_bases(lines)))
             frames_set = sorted(set(_extract_frame_letters(lines)))
@@ -144,8 +116,6 @@ def check_bases_vs_frames(pdf_path: str) -> dict:
                 "extra_bases":   extra,
                 "page_ok": page_ok,
             }
-    finally:
-        doc.close()
     return report
 
 # ------------------------
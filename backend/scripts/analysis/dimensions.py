@@ -0,0 +1,44 @@
+import re
+from functools import lru_cache
+from typing import Iterable
+
+# =========================
+# Распознавание размерных текстов / сносок
+# =========================
+
+DIMENSION_PATTERNS = [
+    r"[⌀ØO]\s*\d+(?:[.,]\d+)?",
+    r"\bR\s*\d+(?:[.,]\d+)?",
+    r"\bM\s*\d+(?:[×xX]\d+(?:[.,]\d+)?)?",
+    r"\d+\s*±\s*\d+(?:[.,]\d+)?",
+    r"[+−\-]\s*\d+(?:[.,]\d+)?",
+    r"\b\d+(?:[.,]\d+)?\s*мм\b",
+    r"\b\d+(?:[.,]\d+)?\s*mm\b",
+    r"\b\d+(?:[.,]\d+)?\s*°\b",
+    r"\b\d+(?:[.,]\d+)?\b"
+]
+
+# Все шаблоны одной альтернацией: search находит совпадение ровно тогда, когда его нашёл бы
+# хотя бы один шаблон по отдельности, но строка просматривается один раз
+DIMENSION_RE = re.compile("|".join(f"(?:{p})" for p in DIMENSION_PATTERNS), flags=re.IGNORECASE)
+_DIGIT_RE = re.compile(r"\d")
+
+_MEMO_MAX = 65_536
+
+
+@lru_cache(maxsize=_MEMO_MAX)
+def _is_dimension_stripped(t: str) -> bool:
+    if len(t) > 60 or len(t) < 1:
+        return False
+    if not _DIGIT_RE.search(t):
+        return False
+    return DIMENSION_RE.search(t) is not None
+
+
+def is_dimension_note(text: str) -> bool:
+    return _is_dimension_stripped((text or "").strip())
+
+
+def classify_dimension_notes(texts: Iterable[str]) -> dict[str, bool]:
+    """Классифицирует все строки страницы разом: {текст: размерный ли}, каждая уникальная строка — один раз."""
+    return {t: is_dimension_note(t) for t in dict.fromkeys(texts)}
@@ -0,0 +1,154 @@
+import re
+from typing import Iterator
+import fitz  # PyMuPDF
+from scripts.analysis.pdf_cache import PageCache
+
+# =========================
+# Общая раскладка страницы: строки, ТТ, основная надпись, поле
+# =========================
+
+# Пункт технических требований: строка начинается с номера ("1 ", "2.", "3)", "4 -")
+TT_ITEM_RE = re.compile(r"^\s*\d+\s*[.)-]?\s+")
+
+TB_KEYWORDS = [
+    "Масштаб", "Масса", "Лит", "Разраб", "Пров", "Т.контр", "Н.контр",
+    "Утв", "Лист", "Листов", "Изм.", "№ докум", "Подп.", "Дата"
+]
+_TB_KEYWORDS_LOW = [k.lower() for k in TB_KEYWORDS]
+
+ROW_Y_TOL_PT = 3.0  # допуск по Y при склейке спанов в строки-ряды (~3pt)
+
+
+def iter_text_lines(struct: dict) -> Iterator[tuple[dict, list[dict], str, list[float], float]]:
+    """
+    Проходит по текстовым строкам структуры get_text('dict'/'rawdict').
+    Отдаёт (line, spans, text, bbox, size): текст спанов склеен, bbox — объединение, size — максимум.
+    """
+    for block in struct.get("blocks", []):
+        if block.get("type", 0) != 0:
+            continue
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            if not spans:
+                continue
+            text = "".join((s.get("text") or "") for s in spans).strip()
+            if not text:
+                continue
+            x0s = [float(s["bbox"][0]) for s in spans]
+            y0s = [float(s["bbox"][1]) for s in spans]
+            x1s = [float(s["bbox"][2]) for s in spans]
+            y1s = [float(s["bbox"][3]) for s in spans]
+            bbox = [min(x0s), min(y0s), max(x1s), max(y1s)]
+            size = max(float(s.get("size", 0.0)) for s in spans)
+            yield line, spans, text, bbox, size
+
+
+def is_tt_line(text: str) -> bool:
+    return bool(TT_ITEM_RE.match(text))
+
+
+def split_tt_and_field(lines: list[dict]) -> tuple[list[dict], list[dict]]:
+    """ТТ — нумерованные пункты, поле — всё остальное."""
+    tt, field = [], []
+    for it in lines:
+        (tt if is_tt_line(it["text"]) else field).append(it)
+    return tt, field
+
+
+def _union_rect(items: list[dict]) -> fitz.Rect:
+    return fitz.Rect(
+        min(it["bbox"][0] for it in items),
+        min(it["bbox"][1] for it in items),
+        max(it["bbox"][2] for it in items),
+        max(it["bbox"][3] for it in items),
+    )
+
+
+def find_title_block(lines: list[dict], page_rect: fitz.Rect) -> tuple[list[dict], fitz.Rect, str]:
+    """Основная надпись: по ключевым словам, иначе по тексту в правом нижнем углу, иначе нижняя полоса."""
+    matches = []
+    for it in lines:
+        low = it["text"].lower().replace("ё", "е")
+        if any(k in low for k in _TB_KEYWORDS_LOW):
+            matches.append(it)
+
+    if len(matches) >= 2:
+        return matches, _union_rect(matches), "keywords"
+
+    # Fallback: bottom-right zone text union
+    w, h = page_rect.width, page_rect.height
+    br_matches = [it for it in lines if it["bbox"][0] > 0.6 * w and it["bbox"][1] > 0.6 * h]
+    if not br_matches:
+        br_matches = [it for it in lines if it["bbox"][0] > 0.5 * w and it["bbox"][1] > 0.7 * h]
+    if br_matches:
+        return br_matches, _union_rect(br_matches), "bottom-right"
+    return [], fitz.Rect(0, page_rect.height - 50, page_rect.width, page_rect.height), "default-bottom-strip"
+
+
+def _group_rows(struct: dict) -> list[dict]:
+    """Склейка спанов в ряды по близости центра по Y (текст рамок допусков бывает разбит на строки)."""
+    raw_spans = []
+    for block in struct.get("blocks", []):
+        if block.get("type", 0) != 0:
+            continue
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                txt = (span.get("text") or "").strip()
+                if not txt:
+                    continue
+                x0, y0, x1, y1 = span["bbox"]
+                raw_spans.append({"text": txt, "bbox": (x0, y0, x1, y1)})
+
+    rows = []
+    for sp in sorted(raw_spans, key=lambda it: (it["bbox"][1], it["bbox"][0])):
+        placed = False
+        cy = (sp["bbox"][1] + sp["bbox"][3]) / 2
+        for row in rows:
+            rcy = (row["bbox"][1] + row["bbox"][3]) / 2
+            if abs(cy - rcy) < ROW_Y_TOL_PT:
+                row["text"] += " " + sp["text"]
+                x0, y0, x1, y1 = row["bbox"]
+                sx0, sy0, sx1, sy1 = sp["bbox"]
+                row["bbox"] = (min(x0, sx0), min(y0, sy0),
+                               max(x1, sx1), max(y1, sy1))
+                placed = True
+                break
+        if not placed:
+            rows.append({"text": sp["text"], "bbox": sp["bbox"]})
+    return rows
+
+
+class PageLayout:
+    """
+    Раскладка одной страницы, считается один раз и используется всеми критериями:
+      - lines        — строки {text, bbox, size}, отсортированы сверху вниз, слева направо;
+      - tt_lines     — пункты технических требований, tt_bbox — их общий прямоугольник (или None);
+      - field_lines  — всё остальное (поле чертежа);
+      - tb_matches / tb_bbox / tb_method — основная надпись;
+      - rows         — спаны, склеенные в ряды по Y (лениво).
+    """
+
+    def __init__(self, pc: PageCache):
+        self._pc = pc
+        struct = pc.text_dict()
+        lines = [
+            {"text": text, "bbox": bbox, "size": size}
+            for _line, _spans, text, bbox, size in iter_text_lines(struct)
+        ]
+        lines.sort(key=lambda it: (it["bbox"][1], it["bbox"][0]))
+        self.lines = lines
+        self.tt_lines, self.field_lines = split_tt_and_field(lines)
+        self.tt_bbox = _union_rect(self.tt_lines) if self.tt_lines else None
+        self.tb_matches, self.tb_bbox, self.tb_method = find_title_block(lines, pc.rect)
+        self._rows = None
+
+    @property
+    def rows(self) -> list[dict]:
+        if self._rows is None:
+            self._rows = _group_rows(self._pc.text_dict())
+        return self._rows
+
+
+def page_layout(pc: PageCache) -> PageLayout:
+    """Раскладка страницы с мемоизацией в PageCache."""
+    return pc.memo("layout", lambda: PageLayout(pc))
@@ -2,71 +2,456 @@ from pathlib import Path
 import fitz  # PyMuPDF
 from typing import List, Dict, Any
 from rich import print
-from scripts.analysis.criterion_1_1_1 import extract_pdf_text_as_dict, filter_titleblock_items, load_config  # :contentReference[oaicite:2]{index=2}
+from scripts.analysis.criterion_1_1_1 import extract_pdf_text_as_dict, filter_titleblock_items, get_config  # :contentReference[oaicite:2]{index=2}
 from scripts.analysis.criterion_1_1_2_n import run_check as run_check_1_1_2                                   # :contentReference[oaicite:3]{index=3}
 from scripts.analysis.criterion_1_1_3_n import check_letter_designations                                        # :contentReference[oaicite:4]{index=4}
 from scripts.analysis.criterion_1_1_4 import check_stars                                                       # :contentReference[oaicite:5]{index=5}
 from scripts.analysis.criterion_1_1_5 import check as check_1_1_5                                              # :contentReference[oaicite:6]{index=6}
 from scripts.analysis.criterion_1_1_6 import check as check_1_1_6                                              # :contentReference[oaicite:7]{index=7}
 from scripts.analysis.criterion_1_1_8 import check_bases_vs_frames
+from scripts.analysis.pdf_cache import DocumentCache, PageCache, open_document
+from scripts.analysis.layout import page_layout
+from scripts.analysis.annotate import page_sizes, render_annotated
+from scripts.analysis.scheduler import Task, run_tasks
+from scripts.analysis.spatial import GridIndex, suggest_cell_size
+from scripts.analysis.tilt import tilt_violations
 import os
-from typing import Optional
-from scripts.analysis.test import check_gost  # 1.1.7 и 1.1.9 через OpenRouter (см. test.py)  :contentReference[oaicite:1]{index=1}
+import base64
+import heapq
+import json
+import math
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+from scripts.analysis.result_cache import get_result_cache, result_key
+from scripts.analysis.test import GOST_RULES, check_gost  # 1.1.7 и 1.1.9 через OpenRouter (см. test.py)  :contentReference[oaicite:1]{index=1}
 
 from scripts.db import SessionLocal
-from scripts.crud import update_document_analysis
+from scripts.crud import get_parent_page_fingerprints, save_criterion_result, update_document_analysis
+from scripts.progress import add_event
+
+# ---------- Фрагменты чертежа для LLM-проверок (1.1.7, 1.1.9) ----------
+# Модели отправляются не целые листы, а вырезки вокруг мест, найденных текстовыми эвристиками
+# (find_ra_without_check — шероховатость, find_gdt_frames — рамки допусков) на всех листах.
+# DPI подбирается под размер вырезки: мелкая рамка — крупнее, большая область — не больше LLM_ROI_TARGET_PX.
+LLM_ROI_PADDING_PT = float(os.getenv("LLM_ROI_PADDING_PT", "48"))
+LLM_ROI_TARGET_PX = int(os.getenv("LLM_ROI_TARGET_PX", "768"))
+LLM_ROI_MIN_DPI = int(os.getenv("LLM_ROI_MIN_DPI", "72"))
+LLM_ROI_MAX_DPI = int(os.getenv("LLM_ROI_MAX_DPI", "300"))
+LLM_ROI_MAX_CROPS = int(os.getenv("LLM_ROI_MAX_CROPS", "6"))
+# нет найденных мест (текст в кривых и т.п.) — 1-й лист целиком, но не крупнее этого по длинной стороне
+LLM_PAGE_MAX_PX = int(os.getenv("LLM_PAGE_MAX_PX", "2048"))
+
+
+def _roi_rects(doc: DocumentCache, rule: str) -> list[tuple[int, fitz.Rect]]:
+    """(номер листа, область с отступом) для правила; пересекающиеся области листа объединяются."""
+    finder = {"1.1.9": find_ra_without_check, "1.1.7": find_gdt_frames}[rule]
+    out: list[tuple[int, fitz.Rect]] = []
+    for pc in doc:
+        # слова — в координатах листа без поворота, clip рендера — с поворотом
+        bounds = pc.rect * pc.page.derotation_matrix
+        merged: list[fitz.Rect] = []
+        for r in finder(pc):
+            box = (fitz.Rect(r) + (-LLM_ROI_PADDING_PT, -LLM_ROI_PADDING_PT,
+                                   LLM_ROI_PADDING_PT, LLM_ROI_PADDING_PT)) & bounds
+            if box.is_empty:
+                continue
+            # объединяем, пока есть пересечения (объединение может задеть следующую область)
+            i = 0
+            while i < len(merged):
+                if merged[i].intersects(box):
+                    box |= merged.pop(i)
+                    i = 0
+                else:
+                    i += 1
+            merged.append(box)
+        out.extend((pc.number, box * pc.page.rotation_matrix) for box in sorted(merged, key=lambda b: (b.y0, b.x0)))
+    return out
+
+
+def _render_data_uri(page: fitz.Page, clip: Optional[fitz.Rect], target_px: int) -> str:
+    """PNG области листа как data URI; DPI — чтобы длинная сторона была около target_px."""
+    rect = clip or page.rect
+    dpi = 72.0 * target_px / max(rect.width, rect.height, 1.0)
+    dpi = min(max(dpi, LLM_ROI_MIN_DPI), LLM_ROI_MAX_DPI)
+    zoom = dpi / 72.0
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    return "data:image/png;base64," + base64.b64encode(pix.tobytes("png")).decode("ascii")
 
-def _pdf_first_page_to_png(pdf_path: str, dpi: int = 200) -> Optional[str]:
+
+def _llm_images(doc: DocumentCache, rule: str) -> list[str]:
     """
-    Рендерит первую страницу PDF в PNG и возвращает путь к PNG.
-    Если не удалось — возвращает None.
+    Изображения для check_gost: вырезки найденных мест (не больше LLM_ROI_MAX_CROPS, по порядку листов),
+    иначе — 1-й лист, уменьшенный до LLM_PAGE_MAX_PX. Пустой список — не удалось.
     """
     try:
-        doc = fitz.open(pdf_path)
-        page = doc[0]
-        zoom = dpi / 72.0
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        out_png = str(Path(pdf_path).with_suffix(".page1.png"))
-        pix.save(out_png)
-        doc.close()
-        return out_png
+        rois = _roi_rects(doc, rule)[:LLM_ROI_MAX_CROPS]
+        if rois:
+            return [_render_data_uri(doc.page(n).page, box, LLM_ROI_TARGET_PX) for n, box in rois]
+        if len(doc):
+            return [_render_data_uri(doc.page(1).page, None, LLM_PAGE_MAX_PX)]
     except Exception:
-        return None
+        pass
+    return []
 
 
 # ---------- PIPELINE ----------
-def pipeline(pdf_path: str) -> dict:
+
+# Версия логики анализа: повышать при любом изменении критериев/отчёта,
+# иначе повторные загрузки того же PDF получат старый результат (см. routers/upload.py)
+ANALYZER_VERSION = "4"
+
+# Число процессов для постраничного анализа (1 — всё в текущем процессе)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "1"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Общий пул процессов; пересоздаётся только при смене размера."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: не форкаем процесс API вместе с его потоками
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def _check_1_1_1(doc: DocumentCache) -> dict:
+    out_1_1_1 = extract_pdf_text_as_dict(doc)
+    return filter_titleblock_items(out_1_1_1, get_config())
+
+
+# Локальные критерии (с bbox) в порядке вывода в отчёт
+LOCAL_CRITERIA = {
+    "1.1.1": _check_1_1_1,
+    "1.1.2": run_check_1_1_2,
+    "1.1.3": check_letter_designations,
+    "1.1.4": check_stars,
+    "1.1.5": check_1_1_5,
+    "1.1.6": check_1_1_6,
+    "1.1.8": check_bases_vs_frames,
+}
+
+# Проверки через OpenRouter (ok/comment, без bbox)
+LLM_CRITERIA = ("1.1.9", "1.1.7")
+
+# Версии критериев для постоянного кэша результатов: повышать при изменении логики критерия
+CRITERIA_VERSIONS = {
+    "1.1.1": "1",
+    "1.1.2": "2",
+    "1.1.3": "1",
+    "1.1.4": "1",
+    "1.1.5": "1",
+    "1.1.6": "1",
+    "1.1.8": "1",
+    "1.1.9": "2",
+    "1.1.7": "2",
+}
+
+# Критерии, читающие config.yaml (1.1.1 использует все его разделы); остальные от конфигурации не зависят
+CONFIG_CRITERIA = {"1.1.1"}
+
+# Входы подсветки критерия (collect_violations) — рёбра графа задач: обводки 1.1.3/1.1.4
+# не ставятся внутри ТТ, а прямоугольник ТТ берётся из отчёта 1.1.2 (tt_bbox_pt)
+CRITERIA_REQUIRES = {
+    "1.1.3": ("1.1.2",),
+    "1.1.4": ("1.1.2",),
+    "1.1.6": ("1.1.5",),  # надпись, уже отмеченная по 1.1.5, по 1.1.6 не обводится
+}
+
+
+def run_local_criteria(doc: DocumentCache, timings: Optional[dict] = None) -> dict:
+    """Критерии 1.1.1–1.1.8 (локальные, с bbox) по страницам документа."""
     output: dict = {}
+    for name, fn in LOCAL_CRITERIA.items():
+        t0 = time.perf_counter()
+        output[name] = fn(doc)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+    return output
+
+
+def _analyze_pages(pdf_path: str, pages: list[int]) -> tuple[dict, dict]:
+    """Задача воркера: сам открывает документ и прогоняет все локальные критерии по своим страницам."""
+    timings: dict = {}
+    with DocumentCache(pdf_path, pages=pages) as doc:
+        return run_local_criteria(doc, timings), timings
+
+
+def merge_page_reports(parts: list[dict]) -> dict:
+    """
+    Склеивает результаты шардов в те же формы отчётов, что и последовательный прогон:
+    страницы по возрастанию, ok — конъюнкция по шардам.
+    """
+    merged: dict = {}
+    for name in LOCAL_CRITERIA:
+        reports = [p[name] for p in parts if name in p]
+        if not reports:
+            continue
+        if name == "1.1.1":
+            # {page: items}
+            pages = {}
+            for rep in reports:
+                pages.update(rep)
+            merged[name] = dict(sorted(pages.items()))
+            continue
+        pages = {}
+        for rep in reports:
+            pages.update(rep.get("pages") or {})
+        rep = dict(reports[0])
+        rep["pages"] = dict(sorted(pages.items()))
+        rep["ok"] = all(r.get("ok", True) for r in reports)
+        merged[name] = rep
+    return merged
+
+
+def _shard_pages(pages: list[int], workers: int) -> list[list[int]]:
+    """Непрерывные диапазоны страниц; шардов вдвое больше воркеров — для выравнивания нагрузки."""
+    n_chunks = max(1, min(len(pages), workers * 2))
+    size, rest = divmod(len(pages), n_chunks)
+    shards, start = [], 0
+    for i in range(n_chunks):
+        end = start + size + (1 if i < rest else 0)
+        shards.append(pages[start:end])
+        start = end
+    return [s for s in shards if s]
+
+
+def run_local_criteria_parallel(doc: DocumentCache, workers: int, timings: Optional[dict] = None) -> dict:
+    """
+    Постраничный анализ в пуле процессов; для одной страницы или одного воркера — в текущем процессе.
+    timings (если передан) получает суммарное по шардам время каждого критерия.
+    """
+    numbers = [pc.number for pc in doc]
+    if workers <= 1 or len(numbers) < 2:
+        return run_local_criteria(doc, timings)
+    executor = _get_executor(workers)
+    futures = [executor.submit(_analyze_pages, doc.path, shard) for shard in _shard_pages(numbers, workers)]
+    parts = []
+    for fut in futures:
+        part, part_timings = fut.result()
+        parts.append(part)
+        if timings is not None:
+            for name, seconds in part_timings.items():
+                timings[name] = timings.get(name, 0.0) + seconds
+    return merge_page_reports(parts)
+
+
+# ---------- Кэш результатов по страницам ----------
+
+def _page_payload(name: str, rep: dict, number: int) -> dict:
+    """Часть отчёта критерия по одной странице (из прогона по этой странице) в JSON-виде."""
+    if name == "1.1.1":
+        payload = {"items": rep.get(number, [])}
+    else:
+        payload = {
+            "header": {k: v for k, v in rep.items() if k not in ("pages", "ok")},
+            "ok": rep.get("ok", True),
+        }
+        pages = rep.get("pages") or {}
+        if number in pages:
+            payload["block"] = pages[number]
+    return json.loads(json.dumps(payload, ensure_ascii=False))
+
+
+def _assemble_report(name: str, doc: DocumentCache, payloads: dict[int, dict]) -> dict:
+    """Собирает отчёт критерия из постраничных частей в том же виде, что и прогон по документу."""
+    numbers = sorted(payloads)
+    if name == "1.1.1":
+        return {n: payloads[n]["items"] for n in numbers}
+    rep = dict(payloads[numbers[0]]["header"]) if numbers else {}
+    if "pdf" in rep:
+        rep["pdf"] = doc.path  # часть могла прийти из кэша другого файла
+    rep["pages"] = {n: payloads[n]["block"] for n in numbers if "block" in payloads[n]}
+    rep["ok"] = all(payloads[n]["ok"] for n in numbers)
+    return rep
+
+
+def _compute_page_payloads(doc: DocumentCache, todo: dict[str, list[int]], timings: Optional[dict] = None) -> dict:
+    """
+    todo = {критерий: [страницы]}. Каждая страница прогоняется отдельно (вид doc.subset),
+    чтобы её ok был точным; извлечение текста при этом общее через PageCache.
+    """
+    out: dict = {}
+    for name, numbers in todo.items():
+        fn = LOCAL_CRITERIA[name]
+        t0 = time.perf_counter()
+        for n in numbers:
+            out[(name, n)] = _page_payload(name, fn(doc.subset([n])), n)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+    return out
+
+
+def _analyze_page_payloads(pdf_path: str, todo: dict[str, list[int]]) -> tuple[dict, dict]:
+    """Задача воркера для режима с кэшем: только недостающие пары (критерий, страница)."""
+    pages = sorted({n for numbers in todo.values() for n in numbers})
+    timings: dict = {}
+    with DocumentCache(pdf_path, pages=pages) as doc:
+        return _compute_page_payloads(doc, todo, timings), timings
+
+
+def _compute_page_payloads_parallel(doc: DocumentCache, todo: dict[str, list[int]], workers: int,
+                                    timings: Optional[dict] = None) -> dict:
+    numbers = sorted({n for ns in todo.values() for n in ns})
+    if workers <= 1 or len(numbers) < 2:
+        return _compute_page_payloads(doc, todo, timings)
+    executor = _get_executor(workers)
+    futures = []
+    for shard in _shard_pages(numbers, workers):
+        in_shard = set(shard)
+        sub = {name: [n for n in ns if n in in_shard] for name, ns in todo.items()}
+        futures.append(executor.submit(_analyze_page_payloads, doc.path, {k: v for k, v in sub.items() if v}))
+    out: dict = {}
+    for fut in futures:
+        part, part_timings = fut.result()
+        out.update(part)
+        if timings is not None:
+            for name, seconds in part_timings.items():
+                timings[name] = timings.get(name, 0.0) + seconds
+    return out
+
+
+def pipeline(
+    pdf_path: "str | DocumentCache",
+    workers: Optional[int] = None,
+    on_progress: Optional[Callable[[str, Any, float, dict], None]] = None,
+) -> dict:
+    """
+    Прогоняет все критерии по документу. Принимает путь или открытый DocumentCache —
+    в последнем случае PDF не переоткрывается, а извлечение текста делится между критериями.
+    workers > 1 — локальные критерии считаются постранично в пуле процессов (по умолчанию ANALYSIS_WORKERS).
+    on_progress(criterion, result, seconds, inputs) вызывается по мере готовности каждого критерия;
+    inputs — готовые результаты из CRITERIA_REQUIRES (нужны для его подсветки).
+    Время по задачам кладётся в output["timings"].
+    """
+    with open_document(pdf_path) as doc:
+        return _pipeline(doc, ANALYSIS_WORKERS if workers is None else workers, on_progress)
 
-    out_1_1_1 = extract_pdf_text_as_dict(pdf_path)
-    res_1_1_1 = filter_titleblock_items(out_1_1_1, load_config("scripts/analysis/config.yaml"))
-    output["1.1.1"] = res_1_1_1
-
-    output["1.1.2"] = run_check_1_1_2(pdf_path)
-    output["1.1.3"] = check_letter_designations(pdf_path)
-    output["1.1.4"] = check_stars(pdf_path)
-    output["1.1.5"] = check_1_1_5(pdf_path)
-    output["1.1.6"] = check_1_1_6(pdf_path)
-    output["1.1.8"] = check_bases_vs_frames(pdf_path)
-        # --- 1.1.7 и 1.1.9: проверки без bbox (ok/comment) ---
-    # Берем API-ключ из переменной окружения, рендерим 1-ю страницу PDF в PNG.
+
+def _pipeline(doc: DocumentCache, workers: int, on_progress=None) -> dict:
+    # --- 1.1.7 и 1.1.9: проверки без bbox (ok/comment) ---
+    # Берем API-ключ из переменной окружения, модели отправляем вырезки найденных мест (см. _llm_images).
     api_key = os.getenv("OPENROUTER_API_KEY")
-    candidate_png = _pdf_first_page_to_png(pdf_path)
 
-    def _safe_check(rule: str) -> dict:
+    def _safe_check(rule: str, images: list[str]) -> dict:
         # стандартный ответ по-умолчанию (если не смогли проверить)
         fallback = {"ok": None, "comment": "Проверка не выполнена (нет API-ключа или изображения)."}
-        if not api_key or not candidate_png:
+        if not api_key or not images:
             return fallback
         try:
-            return check_gost(rule, candidate_png, api_key)
+            return check_gost(rule, images, api_key)
         except Exception as e:
             return {"ok": None, "comment": f"Проверка не выполнена: {e}"}
 
-    output["1.1.9"] = _safe_check("1.1.9")
-    output["1.1.7"] = _safe_check("1.1.7")
-
+    # --- постоянный кэш: какие пары (критерий, страница) и LLM-проверки уже посчитаны ---
+    cache = get_result_cache() if len(doc) else None
+    page_keys: dict = {}
+    cached_pages: dict = {}
+    llm_keys: dict = {}
+    llm_cached: dict = {}
+    if cache is not None:
+        conf_hash = get_config().hash
+        for name in LOCAL_CRITERIA:
+            section = conf_hash if name in CONFIG_CRITERIA else ""
+            for pc in doc:
+                page_keys[(name, pc.number)] = result_key("page", name, CRITERIA_VERSIONS[name], section, pc.fingerprint())
+        # вырезки берутся со всех листов — ключ зависит от содержимого каждого и от параметров вырезок
+        all_pages = ",".join(pc.fingerprint() for pc in doc)
+        roi_params = (LLM_ROI_PADDING_PT, LLM_ROI_TARGET_PX, LLM_ROI_MIN_DPI, LLM_ROI_MAX_DPI,
+                      LLM_ROI_MAX_CROPS, LLM_PAGE_MAX_PX)
+        for rule in LLM_CRITERIA:
+            rule_data = json.dumps(GOST_RULES.get(rule), sort_keys=True, ensure_ascii=False)
+            llm_keys[rule] = result_key("llm", rule, CRITERIA_VERSIONS[rule], rule_data, roi_params, all_pages)
+        hits = cache.get_many(list(page_keys.values()) + list(llm_keys.values()))
+        cached_pages = {k: hits[key] for k, key in page_keys.items() if key in hits}
+        llm_cached = {rule: hits[key] for rule, key in llm_keys.items() if key in hits}
+    todo = {
+        name: [pc.number for pc in doc if (name, pc.number) not in cached_pages]
+        for name in LOCAL_CRITERIA
+    }
+    fresh_pages: dict = {}
+
+    def _cached_report(name: str, computed: dict) -> dict:
+        fresh_pages.update(computed)
+        payloads = {n: (computed.get((name, n)) or cached_pages[(name, n)]) for n in (pc.number for pc in doc)}
+        return _assemble_report(name, doc, payloads)
+
+    # Граф: вырезки для правила → сетевая проверка (потоки) идут параллельно с локальными критериями;
+    # 1.1.3/1.1.4 ждут 1.1.2 (CRITERIA_REQUIRES). Все обращения к PyMuPDF — в вызывающем потоке:
+    # документы fitz не потокобезопасны, а отдать задачу в другой процесс — значит пиклить DocumentCache.
+    # Поэтому параллелизм CPU — только постраничный пул процессов (workers > 1) внутри задачи «local»;
+    # при workers = 1 локальные критерии идут по очереди, и с ними перекрывается лишь LLM-ветка.
+    tasks = []
+    for rule in LLM_CRITERIA:
+        if rule in llm_cached:
+            tasks.append(Task(rule, lambda deps, rule=rule: llm_cached[rule], kind="io"))
+        else:
+            # без ключа вырезки не нужны — не тратим время на рендер
+            tasks.append(Task(f"{rule}.roi", lambda deps, rule=rule: _llm_images(doc, rule) if api_key else []))
+            tasks.append(Task(rule, lambda deps, rule=rule: _safe_check(rule, deps[f"{rule}.roi"]),
+                              requires=(f"{rule}.roi",), kind="io"))
+
+    local_timings: dict = {}
+    parallel = workers > 1 and len(doc) > 1
+    if cache is not None and parallel:
+        def _local_cached(deps):
+            computed = _compute_page_payloads_parallel(doc, {k: v for k, v in todo.items() if v}, workers, local_timings)
+            return {name: _cached_report(name, computed) for name in LOCAL_CRITERIA}
+        tasks.append(Task("local", _local_cached))
+    elif cache is not None:
+        for name in LOCAL_CRITERIA:
+            tasks.append(Task(name, lambda deps, name=name: _cached_report(
+                name, _compute_page_payloads(doc, {name: todo[name]})), requires=CRITERIA_REQUIRES.get(name, ())))
+    elif parallel:
+        tasks.append(Task("local", lambda deps: run_local_criteria_parallel(doc, workers, local_timings)))
+    else:
+        for name, fn in LOCAL_CRITERIA.items():
+            tasks.append(Task(name, lambda deps, fn=fn: fn(doc), requires=CRITERIA_REQUIRES.get(name, ())))
+
+    done: dict = {}
+
+    def _on_done(name: str, res: Any, seconds: float):
+        if on_progress is None:
+            return
+        if name == "local":
+            for crit in LOCAL_CRITERIA:
+                inputs = {r: res[r] for r in CRITERIA_REQUIRES.get(crit, ())}
+                on_progress(crit, res[crit], local_timings.get(crit, 0.0), inputs)
+        elif name in LOCAL_CRITERIA or name in LLM_CRITERIA:
+            done[name] = res
+            # зависимости объявлены в задачах — к этому моменту они уже готовы
+            on_progress(name, res, seconds, {r: done[r] for r in CRITERIA_REQUIRES.get(name, ())})
+
+    results, timings = run_tasks(tasks, io_workers=len(LLM_CRITERIA), on_done=_on_done)
+
+    local = results["local"] if parallel else results
+    output: dict = {name: local[name] for name in LOCAL_CRITERIA}
+    for rule in LLM_CRITERIA:
+        output[rule] = results[rule]
+    timings.update({name: round(sec, 4) for name, sec in local_timings.items()})
+    output["timings"] = timings
+
+    if cache is not None:
+        fresh = {page_keys[k]: payload for k, payload in fresh_pages.items()}
+        for rule in LLM_CRITERIA:
+            # неудавшиеся проверки (ok=None: нет ключа, ошибка сети) не кэшируем
+            if rule not in llm_cached and output[rule].get("ok") is not None:
+                fresh[llm_keys[rule]] = output[rule]
+        cache.put_many(fresh)
+        output["cache"] = {
+            "page_hits": len(cached_pages),
+            "page_misses": len(fresh_pages),
+            "llm_hits": len(llm_cached),
+        }
     return output
 
 
@@ -79,12 +464,15 @@ from typing import Iterable, Tuple
 GD_T_SYMBOLS = set("⊥∥⌖⌓⏥⌭⌯⟂⟂⟂⌀")  # позиционность, параллельность, профиль, и пр. (как минимум самые частые)
 VERT_BAR = {"|", "⎪", "¦"}  # вертикальные разделители в рамке
 
-def _words_by_lines(page: fitz.Page) -> dict:
+def _words_by_lines(page: "fitz.Page | PageCache") -> dict:
     """
     Группирует page.get_text('words') по (block, line).
     Возвращает: {(block_no, line_no): [ (x0,y0,x1,y1, text, ...), ... ]}
     """
-    words = page.get_text("words")  # x0,y0,x1,y1,text, block, line, word
+    if isinstance(page, PageCache):
+        words = page.words()
+    else:
+        words = page.get_text("words")  # x0,y0,x1,y1,text, block, line, word
     by_line = {}
     for w in words:
         *xyxy, text, block, line, _ = w
@@ -102,7 +490,7 @@ def _cluster_rect(words: Iterable[Tuple[float, float, float, float, str, int, in
     return fitz.Rect(min(xs0), min(ys0), max(xs1), max(ys1))
 
 
-def find_ra_without_check(page: fitz.Page) -> list[fitz.Rect]:
+def find_ra_without_check(page: "fitz.Page | PageCache") -> list[fitz.Rect]:
     """
     Ищет последовательности вида 'Ra <число>' и проверяет, есть ли дальше скобки '(...)' с символом '√'.
     Если '√' (U+221A) нет, возвращает bbox кластера 'Ra + значение (+ скобки, если есть)'.
@@ -164,7 +552,7 @@ def find_ra_without_check(page: fitz.Page) -> list[fitz.Rect]:
     return result
 
 
-def find_gdt_frames(page: fitz.Page) -> list[fitz.Rect]:
+def find_gdt_frames(page: "fitz.Page | PageCache") -> list[fitz.Rect]:
     """
     Находит «похожие на контрольные рамки GD&T» строки:
     — в строке есть хотя бы один символ из GD_T_SYMBOLS И хотя бы один вертикальный разделитель.
@@ -180,50 +568,17 @@ def find_gdt_frames(page: fitz.Page) -> list[fitz.Rect]:
     return result
 
 
-def _union_tt_bbox(report_1_1_2: dict, page_index: int):
+def _tt_bbox(doc: DocumentCache, page_index: int, rep_112: Optional[dict]):
+    """Прямоугольник ТТ страницы из отчёта 1.1.2; без отчёта — из общей раскладки (та же, что у 1.1.2)."""
+    pages = (rep_112 or {}).get("pages") or {}
+    info = pages.get(page_index) or pages.get(str(page_index))
+    if info is not None and "tt_bbox_pt" in info:
+        return fitz.Rect(info["tt_bbox_pt"]) if info["tt_bbox_pt"] else None
     try:
-        page = report_1_1_2["pages"][page_index]
-        cols = page.get("tt_columns") or []
-        if not cols:
-            return None
-        rects = [fitz.Rect(*c["bbox_pt"]) for c in cols]
-        x0 = min(r.x0 for r in rects); y0 = min(r.y0 for r in rects)
-        x1 = max(r.x1 for r in rects); y1 = max(r.y1 for r in rects)
-        return fitz.Rect(x0, y0, x1, y1)
+        return page_layout(doc.page(page_index)).tt_bbox
     except Exception:
         return None
 
-# --- NEW: утилиты для группировки одинаковых объектов 1.1.5/1.1.6 ---
-_DIM_CRITS = {"1.1.5", "1.1.6"}
-
-def _dim_group_key(item: dict) -> tuple | None:
-    """
-    Если item относится к 1.1.5/1.1.6 — вернуть ключ группировки «одного объекта».
-    Берём текст (meta['text']) как идентификатор. Если текста нет — None.
-    """
-    c = item["criterion"]
-    if c in _DIM_CRITS:
-        meta = item.get("meta") or {}
-        t = meta.get("text")
-        if t:
-            # нормализуем пробелы
-            t = " ".join(str(t).split())
-            return ("DIM_TILT", t)
-    return None
-
-
-def _prefer_criterion(candidates: set[str]) -> str:
-    """
-    Для группы 1.1.5/1.1.6 отдаём приоритет 1.1.5.
-    Для всех остальных — единственный элемент множества.
-    """
-    if candidates & _DIM_CRITS:
-        return "1.1.5" if "1.1.5" in candidates else "1.1.6"
-    # fallback
-    return sorted(candidates)[0]
-
-
-
 def _add_violation(viol_list: list, page: int, bbox, crit: str, note: str, payload: dict | None = None):
     viol_list.append({
         "page": page,
@@ -252,8 +607,13 @@ def _iou(r1: fitz.Rect, r2: fitz.Rect) -> float:
     return inter.get_area() / (a1 + a2 - inter.get_area() + 1e-9)
 
 
-def collect_violations(pdf_path: str, out: dict) -> list[dict]:
+def collect_violations(pdf_path: "str | DocumentCache", out: dict) -> list[dict]:
     """Собирает все нарушения с bbox (без объединения)."""
+    with open_document(pdf_path) as doc:
+        return _collect_violations(doc, out)
+
+
+def _collect_violations(doc: DocumentCache, out: dict) -> list[dict]:
     violations: list[dict] = []
 
     # --- 1.1.1 ---
@@ -280,73 +640,63 @@ def collect_violations(pdf_path: str, out: dict) -> list[dict]:
             })
 
     # --- 1.1.4: «на поле есть, в ТТ нет» — обводим найденное на поле ---
-    rep_112 = out.get("1.1.2") or {}
     rep_114 = out.get("1.1.4") or {}
     try:
-        doc = fitz.open(pdf_path)
-        try:
-            for page_idx, page_info in (rep_114.get("pages") or {}).items():
-                p = int(page_idx)
-                tokens = page_info.get("missing_in_tt") or []
-                if not tokens:
-                    continue
-                page = doc[p - 1]
-                tt_rect = _union_tt_bbox(rep_112, p)
-                for token in tokens:
-                    for r in page.search_for(token) or []:
-                        if tt_rect and r.intersects(tt_rect):
-                            continue
-                        _add_violation(
-                            violations, p, [r.x0, r.y0, r.x1, r.y1],
-                            "1.1.4", f"На поле присутствует '{token}', но в ТТ отсутствует",
-                            {"token": token}
-                        )
-        finally:
-            doc.close()
+        for page_idx, page_info in (rep_114.get("pages") or {}).items():
+            p = int(page_idx)
+            tokens = page_info.get("missing_in_tt") or []
+            if not tokens:
+                continue
+            page = doc.page(p).page
+            tt_rect = _tt_bbox(doc, p, out.get("1.1.2"))
+            for token in tokens:
+                for r in page.search_for(token) or []:
+                    if tt_rect and r.intersects(tt_rect):
+                        continue
+                    _add_violation(
+                        violations, p, [r.x0, r.y0, r.x1, r.y1],
+                        "1.1.4", f"На поле присутствует '{token}', но в ТТ отсутствует",
+                        {"token": token}
+                    )
     except Exception:
         pass
 
         # --- 1.1.3: на поле обнаружены лишние буквенные обозначения (extra_on_field) — обводим эти буквы ---
     rep_113 = out.get("1.1.3") or {}
-    rep_112 = out.get("1.1.2") or {}
     try:
-        doc = fitz.open(pdf_path)
-        try:
-            for page_idx, page_info in (rep_113.get("pages") or {}).items():
-                p = int(page_idx)
-                extra_letters = page_info.get("extra_on_field") or []
-                if not extra_letters:
-                    continue
+        for page_idx, page_info in (rep_113.get("pages") or {}).items():
+            p = int(page_idx)
+            extra_letters = page_info.get("extra_on_field") or []
+            if not extra_letters:
+                continue
 
-                page = doc[p - 1]
-                tt_rect = _union_tt_bbox(rep_112, p)
+            pc = doc.page(p)
+            tt_rect = _tt_bbox(doc, p, out.get("1.1.2"))
 
-                # берём слова со страницы и ищем РОВНО одну букву
-                words = page.get_text("words")  # (x0,y0,x1,y1, "text", block, line, word_no)
-                for (x0, y0, x1, y1, w, *_rest) in words:
-                    text = str(w).strip()
-                    # только одна кириллическая буква
-                    if not text or len(text) != 1:
-                        continue
-                    if not fitz.re.match(r"[А-Яа-яЁё]$", text):
-                        continue
+            # берём слова со страницы и ищем РОВНО одну букву
+            words = pc.words()  # (x0,y0,x1,y1, "text", block, line, word_no)
+            for (x0, y0, x1, y1, w, *_rest) in words:
+                text = str(w).strip()
+                # только одна кириллическая буква
+                if not text or len(text) != 1:
+                    continue
+                if not fitz.re.match(r"[А-Яа-яЁё]$", text):
+                    continue
 
-                    up = text.upper()
-                    if up not in {str(L).upper() for L in extra_letters}:
-                        continue
+                up = text.upper()
+                if up not in {str(L).upper() for L in extra_letters}:
+                    continue
 
-                    r = fitz.Rect(x0, y0, x1, y1)
-                    # исключаем ТТ
-                    if tt_rect and r.intersects(tt_rect):
-                        continue
+                r = fitz.Rect(x0, y0, x1, y1)
+                # исключаем ТТ
+                if tt_rect and r.intersects(tt_rect):
+                    continue
 
-                    _add_violation(
-                        violations, p, [r.x0, r.y0, r.x1, r.y1],
-                        "1.1.3", f"Буква «{up}» присутствует на поле, но в ТТ не используется",
-                        {"letter": up}
-                    )
-        finally:
-            doc.close()
+                _add_violation(
+                    violations, p, [r.x0, r.y0, r.x1, r.y1],
+                    "1.1.3", f"Буква «{up}» присутствует на поле, но в ТТ не используется",
+                    {"letter": up}
+                )
     except Exception:
         pass
 
@@ -355,20 +705,15 @@ def collect_violations(pdf_path: str, out: dict) -> list[dict]:
     rep_119 = out.get("1.1.9") or {}
     if rep_119.get("ok") is False:
         try:
-            doc = fitz.open(pdf_path)
-            try:
-                # при желании можно пройтись по всем страницам; пока 1-я страница — чаще всего там легенда/титулы
-                for p in range(1, len(doc) + 1):
-                    page = doc[p - 1]
-                    rects = find_ra_without_check(page)
-                    for r in rects:
-                        _add_violation(
-                            violations, p, [r.x0, r.y0, r.x1, r.y1],
-                            "1.1.9", rep_119.get("comment") or "Ra без знака √ в скобках",
-                            {"detector": "text-heuristic", "feature": "Ra"}
-                        )
-            finally:
-                doc.close()
+            # при желании можно пройтись по всем страницам; пока 1-я страница — чаще всего там легенда/титулы
+            for pc in doc:
+                rects = find_ra_without_check(pc)
+                for r in rects:
+                    _add_violation(
+                        violations, pc.number, [r.x0, r.y0, r.x1, r.y1],
+                        "1.1.9", rep_119.get("comment") or "Ra без знака √ в скобках",
+                        {"detector": "text-heuristic", "feature": "Ra"}
+                    )
         except Exception:
             pass
 
@@ -376,55 +721,101 @@ def collect_violations(pdf_path: str, out: dict) -> list[dict]:
     rep_117 = out.get("1.1.7") or {}
     if rep_117.get("ok") is False:
         try:
-            doc = fitz.open(pdf_path)
-            try:
-                for p in range(1, len(doc) + 1):
-                    page = doc[p - 1]
-                    rects = find_gdt_frames(page)
-                    for r in rects:
-                        _add_violation(
-                            violations, p, [r.x0, r.y0, r.x1, r.y1],
-                            "1.1.7", rep_117.get("comment") or "Проверьте наличие дополнительной стрелки",
-                            {"detector": "text-heuristic", "feature": "gdt-frame"}
-                        )
-            finally:
-                doc.close()
+            for pc in doc:
+                rects = find_gdt_frames(pc)
+                for r in rects:
+                    _add_violation(
+                        violations, pc.number, [r.x0, r.y0, r.x1, r.y1],
+                        "1.1.7", rep_117.get("comment") or "Проверьте наличие дополнительной стрелки",
+                        {"detector": "text-heuristic", "feature": "gdt-frame"}
+                    )
         except Exception:
             pass
 
 
 
-    # --- 1.1.5 ---
-    rep_115 = out.get("1.1.5") or {}
-    for page_idx, page_block in (rep_115.get("pages") or {}).items():
-        for v in page_block.get("violations") or []:
-            bbox = v["bbox"]
-            txt = v.get("text") or ""
-            tilt = v.get("tilt_deg")
-            thr = rep_115.get("threshold_deg")
-            note = f"Наклон {tilt}° > порога {thr}° — «{txt}»"
-            _add_violation(violations, int(page_idx), bbox, "1.1.5", note, v)
-
-    # --- 1.1.6 ---
-    rep_116 = out.get("1.1.6") or {}
-    for page_idx, page_block in (rep_116.get("pages") or {}).items():
-        for v in page_block.get("violations") or []:
-            bbox = v["bbox"]
-            txt = v.get("text") or ""
-            tilt = v.get("tilt_deg")
-            thr = rep_116.get("threshold_deg")
-            note = f"Наклон {tilt}° > порога {thr}° — «{txt}»"
-            _add_violation(violations, int(page_idx), bbox, "1.1.6", note, v)
+    # --- 1.1.5 / 1.1.6: один список, каждая надпись — один раз (см. tilt.tilt_violations) ---
+    for crit, page, v, thr in tilt_violations(out.get("1.1.5"), out.get("1.1.6")):
+        note = f"Наклон {v.get('tilt_deg')}° > порога {thr}° — «{v.get('text') or ''}»"
+        _add_violation(violations, page, v["bbox"], crit, note, v)
 
     return violations
 
 
+def _cluster_page(items: List[Dict[str, Any]], iou_threshold: float, dist_threshold: float):
+    """
+    Жадная кластеризация одной страницы: кластер растёт, пока к его объединённому прямоугольнику
+    есть близкие (IoU >= порога или расстояние < порога) элементы. Отдаёт (индексы, прямоугольник)
+    в том же порядке и с тем же порядком индексов, что и полный перебор:
+    проход по j по возрастанию, повтор прохода, пока кластер меняется.
+
+    Кандидаты берутся из равномерной сетки: подходящий элемент обязан пересекать прямоугольник
+    кластера, расширенный на dist_threshold, поэтому остальные можно не проверять.
+    """
+    rects = [fitz.Rect(*v["bbox"]) for v in items]
+    n = len(rects)
+    boxes = [tuple(r) for r in rects]
+    # IoU >= 0 выполняется всегда, а нечисловые bbox сетка не разложит — тогда кандидаты все
+    brute = iou_threshold <= 0 or not all(math.isfinite(c) for b in boxes for c in b)
+    pad = max(dist_threshold, 0.0)
+    grid = None if brute else GridIndex(boxes, suggest_cell_size(boxes, dist_threshold))
+
+    used = [False] * n
+    for i in range(n):
+        if used[i]:
+            continue
+        cluster_rect = rects[i]
+        cluster_idx = [i]
+        in_cluster = {i}
+
+        def _free(k: int) -> bool:
+            return not used[k] and k not in in_cluster
+
+        changed = True
+        while changed:
+            changed = False
+            # один проход: как и полный перебор, проверяем j по возрастанию против текущего прямоугольника
+            if brute:
+                heap = [k for k in range(n) if _free(k)]
+                cell_range = None
+            else:
+                cell_range = grid.cell_range(tuple(cluster_rect), pad)
+                heap = {k for k in grid.items_in(*cell_range) if _free(k)}
+                heap.update(k for k in grid.big if _free(k))
+                heap = list(heap)
+            heapq.heapify(heap)
+            queued = set(heap)
+            while heap:
+                j = heapq.heappop(heap)
+                r2 = rects[j]
+                if _iou(cluster_rect, r2) >= iou_threshold or _rect_distance(cluster_rect, r2) < dist_threshold:
+                    cluster_idx.append(j)
+                    in_cluster.add(j)
+                    cluster_rect = cluster_rect | r2
+                    changed = True
+                    if brute:
+                        continue
+                    # прямоугольник вырос: досматриваем новые ячейки; элементы с меньшим индексом
+                    # в этом проходе уже не проверяются (как и в полном переборе) — их увидит следующий
+                    new_range = grid.cell_range(tuple(cluster_rect), pad)
+                    if new_range != cell_range:
+                        for k in grid.items_in(*new_range, skip=cell_range):
+                            if k > j and k not in queued and _free(k):
+                                queued.add(k)
+                                heapq.heappush(heap, k)
+                        cell_range = new_range
+        for idx in cluster_idx:
+            used[idx] = True
+        yield cluster_idx, cluster_rect
+
+
 def merge_violations(violations: List[Dict[str, Any]],
                      iou_threshold: float = 0.30,
                      dist_threshold: float = 8.0) -> List[Dict[str, Any]]:
     """
     Объединяет близкие/перекрывающиеся нарушения в кластеры.
-    Дополнительно внутри кластера схлопывает 1.1.5/1.1.6 по одному и тому же объекту (тексту).
+    Повторы одной надписи по 1.1.5/1.1.6 сюда уже не попадают (tilt.tilt_violations);
+    внутри кластера убираются только дословные дубли (пункт, описание).
     """
     by_page: Dict[int, List[Dict[str, Any]]] = {}
     for v in violations:
@@ -433,56 +824,10 @@ def merge_violations(violations: List[Dict[str, Any]],
     merged_all: List[Dict[str, Any]] = []
 
     for page, items in by_page.items():
-        used = [False] * len(items)
-        for i, v in enumerate(items):
-            if used[i]:
-                continue
-            cluster_rect = fitz.Rect(*v["bbox"])
-            cluster_idx = [i]
-            changed = True
-            while changed:
-                changed = False
-                for j, w in enumerate(items):
-                    if used[j] or j in cluster_idx:
-                        continue
-                    r2 = fitz.Rect(*w["bbox"])
-                    if _iou(cluster_rect, r2) >= iou_threshold or _rect_distance(cluster_rect, r2) < dist_threshold:
-                        cluster_idx.append(j)
-                        cluster_rect = cluster_rect | r2
-                        changed = True
-            for idx in cluster_idx:
-                used[idx] = True
-
-            # --- внутри кластера собираем элементы и схлопываем дубли ---
-            # 1) сначала сгруппируем 1.1.5/1.1.6 по объекту (тексту)
-            groups_by_obj: Dict[tuple, List[dict]] = {}
-            plain_items: List[dict] = []
-
+        for cluster_idx, cluster_rect in _cluster_page(items, iou_threshold, dist_threshold):
+            unique_pairs = {}
             for idx in cluster_idx:
                 it = items[idx]
-                gk = _dim_group_key(it)
-                if gk is not None:
-                    groups_by_obj.setdefault(gk, []).append(it)
-                else:
-                    plain_items.append(it)
-
-            merged_items: List[dict] = []
-
-            # 1a) для каждой DIM-группы выбираем «предпочтительный» пункт и описание
-            for gk, members in groups_by_obj.items():
-                crits = {m["criterion"] for m in members}
-                chosen_crit = _prefer_criterion(crits)  # 1.1.5 > 1.1.6
-                # выберем note от 1.1.5 если есть, иначе первый попавшийся
-                note_515 = next((m["note"] for m in members if m["criterion"] == "1.1.5"), None)
-                chosen_note = note_515 if note_515 is not None else members[0]["note"]
-                # meta тоже возьмём у 1.1.5 если есть
-                meta_515 = next((m.get("meta", {}) for m in members if m["criterion"] == "1.1.5"), {})
-                chosen_meta = meta_515 if meta_515 else (members[0].get("meta", {}) or {})
-                merged_items.append({"criterion": chosen_crit, "note": chosen_note, "meta": chosen_meta})
-
-            # 1b) добавляем остальные пункты и убираем дословные дубли по (criterion, note)
-            unique_pairs = {}
-            for it in plain_items + merged_items:
                 c = it["criterion"]; n = it["note"]
                 unique_pairs[(c, n)] = {"criterion": c, "note": n, "meta": it.get("meta", {})}
 
@@ -501,39 +846,133 @@ def merge_violations(violations: List[Dict[str, Any]],
     merged_all.sort(key=lambda x: (x["page"], x["bbox"][1], x["bbox"][0]))
     return merged_all
 
-def make_report_files(pdf_path: str, doc_id: int = None) -> tuple[Path, Path]:
+def summarize_violations(merged: List[Dict[str, Any]]) -> dict:
+    """Сводка как у parse_report по TXT-реестру: описания кластера засчитываются каждому его пункту."""
+    errors: dict = {}
+    for v in merged:
+        for c in v["criteria"]:
+            errors[c] = errors.get(c, 0) + len(v["items"])
+    error_counts = dict(sorted(errors.items()))
+    return {
+        "error_points": list(error_counts.keys()),
+        "error_counts": error_counts,
+        "total_violations": len(merged),
+    }
+
+
+# ---------- События хода анализа (для /progress) ----------
+def _emit(doc_id: int, kind: str, criterion: str = None, payload: dict = None):
+    # ход анализа — вспомогательная информация: сбой записи события не должен ронять анализ
+    try:
+        with SessionLocal() as db:
+            add_event(db, doc_id, kind, criterion, payload)
+    except Exception as e:
+        print(f"[progress] событие {kind} для документа {doc_id} не записано: {e}")
+
+
+def _save_criterion(doc_id: int, doc: DocumentCache, criterion: str, result: Any, seconds: float,
+                    inputs: Optional[dict] = None) -> dict:
     """
-    Делает PDF с обводкой (после объединения) и TXT-реестр (без дублей).
-    Номера и пункты выводятся максимально явно.
+    Сохраняет итог критерия, как только он готов: /result показывает его, не дожидаясь остальных.
+    Нарушения — до объединения в кластеры (объединение и нумерация — в итоговом отчёте).
+    inputs — результаты, от которых зависит подсветка критерия (CRITERIA_REQUIRES).
+    Возвращает статус критерия в том же виде, что /result (criteria[...]).
+    """
+    try:
+        violations = [
+            {"page": v["page"], "bbox": v["bbox"], "note": v["note"]}
+            for v in _collect_violations(doc, {**(inputs or {}), criterion: result})
+            if v["criterion"] == criterion
+        ]
+    except Exception:
+        violations = []  # частичный результат не должен ронять анализ; итоговый отчёт соберётся заново
+    if isinstance(result, dict) and "ok" in result:
+        ok = result["ok"]
+    else:
+        ok = not violations  # 1.1.1 отдаёт элементы по страницам без общего ok
+    comment = result.get("comment") if isinstance(result, dict) and criterion in LLM_CRITERIA else None
+    seconds = round(seconds, 3)
+    try:
+        with SessionLocal() as db:
+            save_criterion_result(db, doc_id, criterion, ok, comment, violations, seconds)
+    except Exception as e:
+        print(f"[progress] итог {criterion} для документа {doc_id} не сохранён: {e}")
+    return {
+        "status": "done",
+        "ok": ok,
+        "comment": comment,
+        "violation_count": len(violations),
+        "violations": violations,
+        "seconds": seconds,
+    }
+
+
+def _progress_reporter(doc_id: int, doc: DocumentCache) -> Callable[[str, Any, float, dict], None]:
     """
-    pipeline_out = pipeline(pdf_path)
-    base_violations = collect_violations(pdf_path, pipeline_out)
-    merged = merge_violations(base_violations)
+    on_progress для pipeline: итог критерия в БД и событие «criterion» с этим итогом и счётчиком готовых —
+    клиенту не нужно перечитывать /result после каждого события.
+    """
+    total = len(LOCAL_CRITERIA) + len(LLM_CRITERIA)
+    finished: list[str] = []
+    lock = threading.Lock()
+
+    def _report(criterion: str, result: Any, seconds: float, inputs: dict):
+        status = _save_criterion(doc_id, doc, criterion, result, seconds, inputs)
+        with lock:
+            finished.append(criterion)
+            completed = len(finished)
+        _emit(doc_id, "criterion", criterion, {**status, "completed": completed, "total": total})
+    return _report
+
+
+def report_header(filename: str) -> str:
+    """Первая строка TXT-реестра."""
+    return f"Файл: {filename}"
+
+
+def retitle_report(report_text: str, filename: str) -> str:
+    """Реестр, переиспользуемый для другой загрузки того же PDF, — с именем этого файла в заголовке."""
+    first, sep, rest = report_text.partition("\n")
+    if first.startswith(report_header("")):
+        return report_header(filename) + sep + rest
+    return report_text
+
 
+def make_report_files(pdf_path: str, doc_id: int = None, workers: Optional[int] = None) -> tuple[Path, Path]:
+    """
+    Делает TXT-реестр (без дублей) и сохраняет объединённые нарушения в БД.
+    PDF с обводкой — по запросу (annotate.ensure_annotated); без doc_id — сразу.
+    Номера и пункты выводятся максимально явно.
+    """
     src = Path(pdf_path)
+    config_hash = get_config().hash  # с какой конфигурацией получен результат
     annotated_path = src.with_suffix(".annotated.pdf")
     txt_path = src.with_suffix(".report.txt")
 
-    # --- PDF ---
-    doc = fitz.open(pdf_path)
-    try:
+    # PDF открывается один раз: анализ и сбор нарушений идут по одному документу
+    with DocumentCache(pdf_path) as cache:
+        # Неизменённые листы ревизии получают те же отпечатки, и их результаты берутся из кэша по страницам
+        pipeline_out = pipeline(cache, workers=workers,
+                                on_progress=_progress_reporter(doc_id, cache) if doc_id else None)
+        page_fingerprints = [cache.page(n).fingerprint() for n in range(1, cache.page_count + 1)]
+        base_violations = collect_violations(cache, pipeline_out)
+        merged = merge_violations(base_violations)
+
+        # номера кластеров — те же, что в TXT и на обводке
         for num, v in enumerate(merged, start=1):
-            p = v["page"]
-            r = fitz.Rect(*v["bbox"])
-            label = f"No {num}: n." + ", ".join(v["criteria"])
-            page = doc[p - 1]
-            # толще рамка и крупнее шрифт
-            page.draw_rect(r, color=(1, 0, 0), width=2.2)
-            y_text = r.y0 - 14 if r.y0 >= 18 else (r.y0 + 14)
-            page.insert_text((r.x0, y_text), label, fontsize=20, color=(1, 0, 0))
             v["num"] = num
-    finally:
-        doc.save(annotated_path)
-        doc.close()
+        # для наложения рамок на оригинал в браузере (/overlay)
+        sizes = page_sizes(cache.doc)
+
+    # --- PDF ---
+    # Для документов сервиса PDF с обводкой строится при первом скачивании (см. annotate.ensure_annotated);
+    # без doc_id (запуск из консоли) скачивания не будет — рисуем сразу.
+    if not doc_id:
+        render_annotated(pdf_path, merged, str(annotated_path))
 
     # --- TXT ---
     lines: List[str] = []
-    lines.append(f"Файл: {src.name}")
+    lines.append(report_header(src.name))
     lines.append(f"Всего нарушений (кластеров): {len(merged)}")
     lines.append("")
 
@@ -574,6 +1013,24 @@ def make_report_files(pdf_path: str, doc_id: int = None) -> tuple[Path, Path]:
                     f"[инфо] 1.1.3: буквы «{letters}» присутствуют на поле, но в ТТ не используются."
                 )
 
+        # ---- Ревизия: какие листы изменились относительно предыдущей версии ----
+    revision = None
+    if doc_id:
+        with SessionLocal() as db:
+            revision = get_parent_page_fingerprints(db, doc_id)
+    if revision is not None:
+        parent_id, parent_fps = revision
+        # лист считается прежним, если такой же был где угодно в предыдущей версии (листы могли переставить)
+        known = set(parent_fps)
+        changed = [n for n, fp in enumerate(page_fingerprints, start=1) if fp not in known]
+        if changed:
+            lines.append(
+                f"[инфо] Ревизия документа №{parent_id}: изменены листы {', '.join(map(str, changed))} "
+                f"(из {len(page_fingerprints)})."
+            )
+        else:
+            lines.append(f"[инфо] Ревизия документа №{parent_id}: содержимое листов не изменилось.")
+
         # ---- Глобальные несоответствия без координат: 1.1.7 и 1.1.9 ----
     for rule in ("1.1.7", "1.1.9"):
         rep = pipeline_out.get(rule) or {}
@@ -584,11 +1041,23 @@ def make_report_files(pdf_path: str, doc_id: int = None) -> tuple[Path, Path]:
             lines.append(f"[инфо] {rule}: {comment}")
 
 
-    Path(txt_path).write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
+    report_text = "\n".join(lines).rstrip() + "\n"
+    Path(txt_path).write_text(report_text, encoding="utf-8")
     if doc_id:
-        # Обновляем запись в БД
+        # Обновляем запись в БД: итог хранится структурно, TXT — только выгрузка
+        summary = summarize_violations(merged)
+        stored = [
+            {"num": v["num"], "page": v["page"], "bbox": v["bbox"], "criteria": v["criteria"],
+             "items": [{"criterion": it["criterion"], "note": it["note"]} for it in v["items"]]}
+            for v in merged
+        ]
         with SessionLocal() as db:
-            update_document_analysis(db, doc_id, annotated_path, txt_path)
+            update_document_analysis(db, doc_id, annotated_path, txt_path,
+                                     config_hash=config_hash, analyzer_version=ANALYZER_VERSION,
+                                     page_fingerprints=page_fingerprints, summary=summary,
+                                     violations=stored, report_text=report_text, page_sizes=sizes)
+        # итог — после записи в БД: получив «done», клиент сразу может запросить /result
+        _emit(doc_id, "done", payload=summary)
 
     return annotated_path, txt_path
 # ---------- CLI ----------
@@ -0,0 +1,229 @@
+import hashlib
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+import fitz  # PyMuPDF
+
+
+# =========================
+# Кэш извлечения по странице
+# =========================
+
+_REF_RE = re.compile(r"\b(\d+) 0 R\b")
+# ссылки назад в дерево страниц (/Parent, /P у аннотаций) в отпечаток не входят
+_BACKREF_RE = re.compile(r"/(?:Parent|P)\s+\d+ 0 R")
+_PAGE_TYPE_RE = re.compile(r"/Type\s*/Page\b")
+_MAX_REF_DEPTH = 64
+
+
+def _object_hash(doc: fitz.Document, xref: int, memo: dict[int, str], active: set[int], depth: int = 0) -> str:
+    """
+    Хэш объекта PDF вместе со всем, на что он ссылается: ссылки «N 0 R» заменяются хэшами
+    объектов, поэтому результат не зависит от нумерации объектов (пересохранение, экспорт новой ревизии).
+    """
+    if xref in memo:
+        return memo[xref]
+    if xref in active or depth > _MAX_REF_DEPTH:
+        return "cycle"
+    active.add(xref)
+    try:
+        obj = _BACKREF_RE.sub("", doc.xref_object(xref, compressed=True))
+        if _PAGE_TYPE_RE.search(obj):
+            # ссылка на другую страницу (например, /Dest у ссылки) — её содержимое не наше
+            digest = "page"
+        else:
+            h = hashlib.sha256()
+            h.update(_REF_RE.sub(lambda m: _object_hash(doc, int(m.group(1)), memo, active, depth + 1), obj)
+                     .encode("utf-8", "replace"))
+            if doc.xref_is_stream(xref):
+                h.update(doc.xref_stream_raw(xref) or b"")
+            digest = h.hexdigest()
+    finally:
+        active.discard(xref)
+    memo[xref] = digest
+    return digest
+
+
+def _page_fingerprint(page: fitz.Page, memo: dict[int, str] | None = None) -> str:
+    """
+    sha256 всего, что влияет на содержимое страницы: размеры и поворот, потоки содержимого,
+    ресурсы (шрифты, XObject'ы, изображения — рекурсивно) и аннотации.
+    Номер страницы и номера объектов в отпечаток не входят: неизменённый лист в новой ревизии
+    документа получает тот же отпечаток. memo — общие для документа хэши объектов (шрифты и т.п.).
+    """
+    doc = page.parent
+    memo = {} if memo is None else memo
+    h = hashlib.sha256()
+    h.update(repr((tuple(page.mediabox), tuple(page.cropbox), page.rotation)).encode())
+    for key in ("Contents", "Resources", "Annots"):
+        kind, value = doc.xref_get_key(page.xref, key)
+        if key == "Resources" and kind == "null":
+            # ресурсы унаследованы от узла дерева страниц
+            node = page.xref
+            for _ in range(32):
+                p_kind, p_value = doc.xref_get_key(node, "Parent")
+                if p_kind != "xref":
+                    break
+                node = int(p_value.split()[0])
+                kind, value = doc.xref_get_key(node, key)
+                if kind != "null":
+                    break
+        value = _REF_RE.sub(lambda m: _object_hash(doc, int(m.group(1)), memo, set()), value)
+        h.update(f"/{key} {kind} {value}".encode("utf-8", "replace"))
+    return h.hexdigest()
+
+
+class PageCache:
+    """
+    Обёртка над fitz.Page: лениво извлекает и запоминает dict / rawdict / words / аннотации.
+    Каждое извлечение выполняется не более одного раза на страницу.
+    """
+
+    def __init__(self, page: fitz.Page, number: int, object_hashes: dict[int, str] | None = None):
+        self.page = page
+        self.number = number  # 1-based, как в отчётах критериев
+        self._memo: dict[Any, Any] = {}
+        self._object_hashes = {} if object_hashes is None else object_hashes
+
+    @property
+    def rect(self) -> fitz.Rect:
+        return self.page.rect
+
+    @property
+    def rotation(self) -> float:
+        return float(self.page.rotation or 0.0)
+
+    def memo(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """Общий механизм мемоизации — для производных структур (раскладка, наклоны и т.п.)."""
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+    def text(self, option: str) -> Any:
+        """page.get_text(option) с мемоизацией ('dict', 'rawdict', 'words', ...)."""
+        return self.memo(("text", option), lambda: self.page.get_text(option))
+
+    def text_dict(self) -> dict:
+        return self.text("dict")
+
+    def rawdict(self) -> dict:
+        return self.text("rawdict")
+
+    def words(self) -> list:
+        return self.text("words")
+
+    def textpage_dict(self) -> dict:
+        """page.get_textpage().extractDICT() — флаги отличаются от get_text('dict'), поэтому храним отдельно."""
+        return self.memo("textpage_dict", lambda: self.page.get_textpage().extractDICT())
+
+    def fingerprint(self) -> str:
+        """Отпечаток содержимого страницы — ключ постоянного кэша результатов."""
+        return self.memo("fingerprint", lambda: _page_fingerprint(self.page, self._object_hashes))
+
+    def annotations(self) -> list[dict]:
+        """Аннотации страницы в виде простых словарей: type / content / rect / rotation."""
+        def _collect():
+            out = []
+            annot = self.page.first_annot
+            while annot:
+                try:
+                    content = (annot.info.get("content") or "").strip()
+                except Exception:
+                    content = ""
+                try:
+                    rotation = float(annot.rotation or 0.0)
+                except Exception:
+                    rotation = 0.0
+                out.append({
+                    "type": annot.type[1],
+                    "content": content,
+                    "rect": fitz.Rect(annot.rect),
+                    "rotation": rotation,
+                })
+                annot = annot.next
+            return out
+        return self.memo("annotations", _collect)
+
+
+# =========================
+# Кэш документа
+# =========================
+
+class DocumentCache:
+    """
+    Документ, открытый один раз на весь конвейер анализа.
+    Все критерии и collect_violations принимают его вместо пути к PDF.
+    pages — необязательный набор 1-based номеров: критерии обойдут только их
+    (так воркеры пула обрабатывают свою часть страниц).
+    """
+
+    def __init__(self, pdf_path: str, pages: Iterable[int] | None = None):
+        self.path = str(pdf_path)
+        self.doc = fitz.open(self.path)
+        self.page_count = self.doc.page_count
+        self._object_hashes: dict[int, str] = {}  # хэши объектов PDF для отпечатков страниц
+        numbers = range(1, self.page_count + 1) if pages is None else sorted(set(pages))
+        self.pages = [PageCache(self.doc[n - 1], n, self._object_hashes) for n in numbers]
+        self._by_number = {pc.number: pc for pc in self.pages}
+        self._parent: "DocumentCache | None" = None
+
+    def subset(self, numbers: Iterable[int]) -> "DocumentCache":
+        """
+        Вид на часть страниц того же документа: критерии обойдут только их.
+        PageCache (и всё, что на них уже извлечено) общие с исходным документом; close() вида PDF не закрывает.
+        """
+        view = DocumentCache.__new__(DocumentCache)
+        view.path = self.path
+        view.doc = self.doc
+        view.page_count = self.page_count
+        view.pages = [self.page(n) for n in sorted(set(numbers))]
+        view._by_number = {pc.number: pc for pc in view.pages}
+        view._object_hashes = self._object_hashes
+        view._parent = self
+        return view
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __iter__(self) -> Iterator[PageCache]:
+        return iter(self.pages)
+
+    def page(self, number: int) -> PageCache:
+        """Страница по 1-based номеру (страницы вне выбранного набора подгружаются по требованию)."""
+        pc = self._by_number.get(number)
+        if pc is None and self._parent is not None:
+            return self._parent.page(number)
+        if pc is None:
+            if not 1 <= number <= self.page_count:
+                raise IndexError(f"Страница {number} вне документа (всего {self.page_count})")
+            pc = self._by_number[number] = PageCache(self.doc[number - 1], number, self._object_hashes)
+        return pc
+
+    def close(self) -> None:
+        self.pages = []
+        self._by_number = {}
+        if self._parent is None:
+            self.doc.close()
+
+    def __enter__(self) -> "DocumentCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@contextmanager
+def open_document(source: "str | Path | DocumentCache") -> Iterator[DocumentCache]:
+    """
+    Принимает путь или уже открытый DocumentCache.
+    Путь открывается и закрывается здесь; чужой DocumentCache не закрывается.
+    """
+    if isinstance(source, DocumentCache):
+        yield source
+        return
+    doc = DocumentCache(str(source))
+    try:
+        yield doc
+    finally:
+        doc.close()
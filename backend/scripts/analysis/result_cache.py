@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+# =========================
+# Постоянный кэш результатов критериев (SQLite)
+# =========================
+# Ключ — хэш от (критерий, его версия, хэш используемой им конфигурации, отпечаток страницы),
+# значение — JSON с частью отчёта по этой странице. Так после правки config.yaml
+# пересчитывается только то, что от неё зависит.
+# Записи старше RESULT_CACHE_MAX_AGE_DAYS удаляются (при открытии и не чаще раза в час после записи):
+# ключи устаревших версий критериев и конфигураций иначе копились бы бесконечно.
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "data/cache/results.sqlite")
+RESULT_CACHE_MAX_AGE_DAYS = float(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "30"))  # 0 — не чистить
+
+_PRUNE_INTERVAL_SECONDS = 3600
+
+
+def result_key(*parts: Any) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Ключ → JSON-значение. Отдельное соединение на поток, запись пакетами."""
+
+    def __init__(self, path: str, max_age_days: float = RESULT_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_results_created ON results (created)")
+        self._last_prune = 0.0
+        self.prune()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        found: dict[str, Any] = {}
+        conn = self._conn()
+        # SQLite ограничивает число параметров запроса
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for key, value in conn.execute(f"SELECT key, value FROM results WHERE key IN ({marks})", chunk):
+                found[key] = json.loads(value)
+        return found
+
+    def put_many(self, items: dict[str, Any]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, json.dumps(v, ensure_ascii=False), now) for k, v in items.items()]
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)", rows)
+        if now - self._last_prune >= _PRUNE_INTERVAL_SECONDS:
+            self.prune()
+
+    def prune(self) -> int:
+        """Удаляет записи старше max_age; возвращает их число."""
+        if self.max_age <= 0:
+            return 0
+        now = time.time()
+        self._last_prune = now
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,)).rowcount
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Общий кэш процесса; RESULT_CACHE_PATH='' отключает кэширование."""
+    global _cache
+    if not RESULT_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(RESULT_CACHE_PATH)
+        return _cache
@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Optional
+
+
+# =========================
+# Планировщик критериев с зависимостями
+# =========================
+
+class Task:
+    """
+    Узел графа анализа.
+      name     — ключ результата (обычно номер критерия: '1.1.2');
+      fn       — fn(deps) -> результат, где deps = {имя зависимости: её результат};
+      requires — имена задач, результаты которых нужны fn;
+      kind     — 'io' (сеть/диск: выполняется в пуле потоков) или 'cpu'
+                 (выполняется в вызывающем потоке: PyMuPDF не потокобезопасен).
+    """
+
+    def __init__(self, name: str, fn: Callable[[dict], Any], requires: Iterable[str] = (), kind: str = "cpu"):
+        if kind not in ("cpu", "io"):
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+        self.kind = kind
+
+
+def _run_timed(fn: Callable[[dict], Any], deps: dict) -> tuple[Any, float]:
+    t0 = time.perf_counter()
+    res = fn(deps)
+    return res, time.perf_counter() - t0
+
+
+def run_tasks(
+    tasks: list[Task],
+    io_workers: int = 4,
+    on_done: Optional[Callable[[str, Any, float], None]] = None,
+) -> tuple[dict, dict]:
+    """
+    Выполняет задачи по мере готовности зависимостей: io-задачи идут в пул потоков,
+    cpu-задачи — по одной в вызывающем потоке, пока io-задачи ждут сеть.
+    Возвращает (results, timings), timings — секунды по каждой задаче.
+    on_done(name, result, seconds) вызывается в вызывающем потоке сразу после завершения задачи.
+    Исключение любой задачи прерывает выполнение и пробрасывается наружу.
+    """
+    by_name = {t.name: t for t in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Имена задач должны быть уникальны")
+    for t in tasks:
+        missing = [r for r in t.requires if r not in by_name]
+        if missing:
+            raise ValueError(f"Задача {t.name}: неизвестные зависимости {missing}")
+
+    results: dict = {}
+    timings: dict = {}
+    pending = list(tasks)  # порядок объявления = приоритет запуска
+    running: dict[Future, str] = {}
+
+    def _finish(name: str, res: Any, seconds: float):
+        results[name] = res
+        timings[name] = round(seconds, 4)
+        if on_done is not None:
+            on_done(name, res, seconds)
+
+    def _ready(t: Task) -> bool:
+        return all(r in results for r in t.requires)
+
+    with ThreadPoolExecutor(max_workers=max(1, io_workers)) as io_pool:
+        while pending or running:
+            # 1) сначала отдаём пулу потоков все готовые io-задачи
+            launched = False
+            for t in list(pending):
+                if t.kind != "io" or not _ready(t):
+                    continue
+                deps = {r: results[r] for r in t.requires}
+                running[io_pool.submit(_run_timed, t.fn, deps)] = t.name
+                pending.remove(t)
+                launched = True
+            if launched:
+                continue
+
+            # 2) затем одну cpu-задачу в текущем потоке (io-задачи тем временем выполняются)
+            inline = next((t for t in pending if t.kind == "cpu" and _ready(t)), None)
+            if inline is not None:
+                pending.remove(inline)
+                res, seconds = _run_timed(inline.fn, {r: results[r] for r in inline.requires})
+                _finish(inline.name, res, seconds)
+                # собираем то, что успело завершиться, не блокируясь
+                for fut in [f for f in running if f.done()]:
+                    res, seconds = fut.result()
+                    _finish(running.pop(fut), res, seconds)
+                continue
+
+            if not running:
+                blocked = [t.name for t in pending]
+                raise RuntimeError(f"Циклические зависимости между задачами: {blocked}")
+
+            # 3) ждём хотя бы одну запущенную задачу
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                res, seconds = fut.result()
+                _finish(running.pop(fut), res, seconds)
+
+    return results, timings
@@ -0,0 +1,72 @@
+import math
+from typing import Iterable, Sequence
+
+
+# =========================
+# Равномерная сетка для поиска соседних прямоугольников
+# =========================
+
+# Прямоугольник, занимающий больше ячеек, хранится отдельным списком и возвращается всегда
+_MAX_CELLS_PER_ITEM = 1024
+
+
+class GridIndex:
+    """
+    Прямоугольники (x0, y0, x1, y1) раскладываются по ячейкам сетки со стороной cell.
+    cells_for() / items_in() дают кандидатов, чьи bbox могут пересекать прямоугольник запроса;
+    точную проверку делает вызывающий код.
+    """
+
+    def __init__(self, boxes: Sequence[Sequence[float]], cell: float):
+        self.cell = max(float(cell), 1e-6)
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        self.big: list[int] = []
+        for idx, b in enumerate(boxes):
+            ix0, iy0, ix1, iy1 = self.cell_range(b)
+            if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > _MAX_CELLS_PER_ITEM:
+                self.big.append(idx)
+                continue
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    self.cells.setdefault((ix, iy), []).append(idx)
+
+    def cell_range(self, b: Sequence[float], pad: float = 0.0) -> tuple[int, int, int, int]:
+        x0, x1 = min(b[0], b[2]) - pad, max(b[0], b[2]) + pad
+        y0, y1 = min(b[1], b[3]) - pad, max(b[1], b[3]) + pad
+        c = self.cell
+        return math.floor(x0 / c), math.floor(y0 / c), math.floor(x1 / c), math.floor(y1 / c)
+
+    def items_in(self, ix0: int, iy0: int, ix1: int, iy1: int,
+                 skip: tuple[int, int, int, int] | None = None) -> Iterable[int]:
+        """
+        Индексы из ячеек диапазона [ix0..ix1]×[iy0..iy1]; ячейки внутри skip пропускаются
+        (нужно, чтобы при росте прямоугольника запроса досматривать только новые ячейки).
+        Индексы могут повторяться. Большие прямоугольники сюда не входят — см. self.big.
+        """
+        cells = self.cells
+        # ячеек в диапазоне может быть больше, чем непустых — тогда перебираем непустые
+        if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > len(cells):
+            for (ix, iy), idxs in cells.items():
+                if not (ix0 <= ix <= ix1 and iy0 <= iy <= iy1):
+                    continue
+                if skip and skip[0] <= ix <= skip[2] and skip[1] <= iy <= skip[3]:
+                    continue
+                yield from idxs
+            return
+        for ix in range(ix0, ix1 + 1):
+            inside_x = skip is not None and skip[0] <= ix <= skip[2]
+            for iy in range(iy0, iy1 + 1):
+                if inside_x and skip[1] <= iy <= skip[3]:
+                    continue
+                idxs = cells.get((ix, iy))
+                if idxs:
+                    yield from idxs
+
+
+def suggest_cell_size(boxes: Sequence[Sequence[float]], dist_threshold: float) -> float:
+    """Сторона ячейки: не меньше типичного размера bbox и удвоенного порога расстояния."""
+    if not boxes:
+        return 1.0
+    dims = sorted(max(abs(b[2] - b[0]), abs(b[3] - b[1])) for b in boxes)
+    median = dims[len(dims) // 2]
+    return max(median, 2.0 * max(dist_threshold, 0.0), 1.0)
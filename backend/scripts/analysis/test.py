@@ -34,7 +34,8 @@ GostRuleType = Literal[tuple(GOST_RULES.keys())]
 
 
 def _is_url(path: str) -> bool:
-    return path.startswith("http://") or path.startswith("https://")
+    # data: — изображение уже закодировано (вырезки чертежа из main.py)
+    return path.startswith("http://") or path.startswith("https://") or path.startswith("data:")
 
 
 def _file_to_data_uri(path: str) -> str:
@@ -56,12 +57,13 @@ def _file_to_data_uri(path: str) -> str:
 
 def check_gost(
     gost_rule: GostRuleType, # <-- ИЗМЕНЕНИЕ: принимаем номер правила
-    candidate_image: str,
+    candidate_image: str | list[str],
     api_key: str,
     model: str = "qwen/qwen2.5-vl-32b-instruct:free",
 ) -> dict:
     """
     Проверяет чертёж на соответствие указанному правилу ГОСТ.
+    candidate_image — путь/URL изображения или список фрагментов одного чертежа.
     Возвращает словарь {"ok": bool, "comment": str}.
     """
     # 1. Проверка и получение данных о правиле из нашего хранилища
@@ -80,6 +82,15 @@ def check_gost(
         " Комментарий должен быть очень сжатым (не более 25 слов)."
     )
 
+    candidates = [candidate_image] if isinstance(candidate_image, str) else list(candidate_image)
+    if not candidates:
+        raise ValueError("Нет изображений чертежа для проверки")
+    if len(candidates) > 1:
+        user_msg += (
+            f" Первое изображение — эталон, следующие {len(candidates)} — фрагменты одного проверяемого чертежа;"
+            " нарушение хотя бы в одном фрагменте означает ok=false."
+        )
+
     # 2. Формирование запроса к модели (логика осталась прежней)
     content_parts = [{"type": "text", "text": user_msg}]
 
@@ -89,11 +100,12 @@ def check_gost(
     else:
         content_parts.append({"type": "image_url", "image_url": {"url": _file_to_data_uri(reference_image)}})
 
-    # Candidate
-    if _is_url(candidate_image):
-        content_parts.append({"type": "image_url", "image_url": {"url": candidate_image}})
-    else:
-        content_parts.append({"type": "image_url", "image_url": {"url": _file_to_data_uri(candidate_image)}})
+    # Candidate (один или несколько фрагментов)
+    for image in candidates:
+        if _is_url(image):
+            content_parts.append({"type": "image_url", "image_url": {"url": image}})
+        else:
+            content_parts.append({"type": "image_url", "image_url": {"url": _file_to_data_uri(image)}})
 
     resp = client.chat.completions.parse(
         model=model,
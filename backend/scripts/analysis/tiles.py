@@ -0,0 +1,169 @@
+import math
+import os
+import threading
+from typing import Iterator, Optional
+import fitz  # PyMuPDF
+
+# =========================
+# Превью листов плитками (как у карт) с кэшем на диске
+# =========================
+# Листы А1/А0 целиком растрировать дорого, а для просмотра нужен только видимый кусок.
+# Уровень z: на z=0 весь лист помещается в одну плитку TILE_SIZE×TILE_SIZE (по длинной стороне),
+# каждый следующий уровень — вдвое крупнее. Плитка (x, y) рисуется через clip только своей области.
+# Готовые PNG лежат в TILE_CACHE_DIR/<источник>/<лист>/<z>/<x>_<y>.png; при превышении
+# TILE_CACHE_MAX_MB удаляются давно не запрошенные (mtime обновляется при каждом обращении).
+
+TILE_SIZE = 256
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "6"))
+TILE_PREWARM_ZOOM = int(os.getenv("TILE_PREWARM_ZOOM", "2"))
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", "data/cache/tiles")
+TILE_CACHE_MAX_MB = int(os.getenv("TILE_CACHE_MAX_MB", "1024"))
+
+# менять при изменении отрисовки плиток — старые не подойдут по пути
+TILE_VERSION = "1"
+
+
+def tile_scale(page_rect: fitz.Rect, z: int) -> float:
+    """Пикселей на пункт на уровне z."""
+    return TILE_SIZE * (2 ** z) / max(page_rect.width, page_rect.height)
+
+
+def tile_grid(page_rect: fitz.Rect, z: int) -> tuple[int, int]:
+    """Число плиток (по x, по y) на уровне z; крайние плитки могут быть меньше TILE_SIZE."""
+    s = tile_scale(page_rect, z)
+    return (max(1, math.ceil(page_rect.width * s / TILE_SIZE)),
+            max(1, math.ceil(page_rect.height * s / TILE_SIZE)))
+
+
+def render_tile(page: fitz.Page, z: int, x: int, y: int) -> Optional[bytes]:
+    """PNG плитки; None — плитки нет (за пределами листа или уровень вне диапазона)."""
+    if not 0 <= z <= TILE_MAX_ZOOM:
+        return None
+    rect = page.rect  # как лист показывается (с учётом поворота)
+    nx, ny = tile_grid(rect, z)
+    if not (0 <= x < nx and 0 <= y < ny):
+        return None
+    s = tile_scale(rect, z)
+    step = TILE_SIZE / s
+    clip = fitz.Rect(rect.x0 + x * step, rect.y0 + y * step,
+                     rect.x0 + (x + 1) * step, rect.y0 + (y + 1) * step) & rect
+    pix = page.get_pixmap(matrix=fitz.Matrix(s, s), clip=clip, alpha=False)
+    return pix.tobytes("png")
+
+
+class TileCache:
+    """Каталог PNG-плиток с ограничением общего размера (LRU по mtime). Общий для API и воркеров."""
+
+    def __init__(self, root: str = TILE_CACHE_DIR, max_bytes: int = TILE_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # оценка занятого места; точный подсчёт — при очистке
+
+    def path(self, source_id: str, page: int, z: int, x: int, y: int) -> str:
+        return os.path.join(self.root, f"{source_id}-v{TILE_VERSION}", str(page), str(z), f"{x}_{y}.png")
+
+    def touch(self, source_id: str, page: int, z: int, x: int, y: int) -> bool:
+        """Отметка «недавно использована» для вытеснения; False — плитки в кэше нет."""
+        try:
+            os.utime(self.path(source_id, page, z, x, y))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get(self, source_id: str, page: int, z: int, x: int, y: int) -> Optional[bytes]:
+        """PNG плитки или None; файл может удалить вытеснение в другом процессе — тогда тоже None."""
+        path = self.path(source_id, page, z, x, y)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, source_id: str, page: int, z: int, x: int, y: int, data: bytes) -> str:
+        path = self.path(source_id, page, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _files(self) -> Iterator[tuple[str, os.stat_result]]:
+        for folder, _dirs, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue  # плитку ещё пишут
+                p = os.path.join(folder, name)
+                try:
+                    yield p, os.stat(p)
+                except FileNotFoundError:
+                    continue  # удалил другой процесс
+
+    def _scan_size(self) -> int:
+        return sum(st.st_size for _p, st in self._files())
+
+    def _evict(self) -> None:
+        """Удаляет самые давние плитки, пока не останется 90% лимита (чтобы не чистить на каждой записи)."""
+        entries = sorted(self._files(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _p, st in entries)
+        target = int(self.max_bytes * 0.9)
+        for p, st in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= st.st_size
+        self._size = total
+
+
+tile_cache = TileCache()
+
+
+def tile_source_id(doc_id: int, content_hash: Optional[str]) -> str:
+    """Плитки общие у документов с одинаковым содержимым PDF (повторная загрузка того же файла)."""
+    return content_hash or f"doc{doc_id}"
+
+
+def get_tile(pdf_path: str, source_id: str, page_number: int, z: int, x: int, y: int) -> Optional[bytes]:
+    """PNG плитки (из кэша или только что нарисованной); None — такой плитки нет."""
+    cached = tile_cache.get(source_id, page_number, z, x, y)
+    if cached is not None:
+        return cached
+    with fitz.open(pdf_path) as doc:
+        if not 1 <= page_number <= doc.page_count:
+            return None
+        data = render_tile(doc[page_number - 1], z, x, y)
+    if data is None:
+        return None
+    tile_cache.put(source_id, page_number, z, x, y, data)
+    return data
+
+
+def prewarm_tiles(pdf_path: str, source_id: str, max_zoom: int = TILE_PREWARM_ZOOM) -> int:
+    """Рисует плитки уровней 0..max_zoom всех листов (документ открывается один раз). Возвращает число новых."""
+    made = 0
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            number = page.number + 1
+            for z in range(0, min(max_zoom, TILE_MAX_ZOOM) + 1):
+                nx, ny = tile_grid(page.rect, z)
+                for y in range(ny):
+                    for x in range(nx):
+                        if tile_cache.touch(source_id, number, z, x, y):
+                            continue
+                        data = render_tile(page, z, x, y)
+                        if data is not None:
+                            tile_cache.put(source_id, number, z, x, y, data)
+                            made += 1
+    return made
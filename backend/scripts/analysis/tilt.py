@@ -0,0 +1,297 @@
+import math
+from collections import defaultdict
+from scripts.analysis.dimensions import classify_dimension_notes
+from scripts.analysis.pdf_cache import DocumentCache, PageCache, open_document
+
+# =========================
+# Наклон текстов: общий движок для 1.1.5 и 1.1.6
+# =========================
+# Один проход по странице даёт оба представления:
+#   - строки с углом по line['dir']           — критерий 1.1.5;
+#   - спаны с углом по матрице спана / строки — критерий 1.1.6 (с поправкой на поворот страницы).
+# rawdict не используется: у его спанов нет 'text' (только 'chars'), и оба критерия всё равно
+# не получали из него ни одного элемента.
+
+# --- Работа с углами ---
+def normalize_tilt(angle_deg: float) -> float:
+    """Наклон относительно горизонтали (0..90], 0 и 180 считаются 0."""
+    a = angle_deg % 180.0
+    if a > 90.0:
+        a = 180.0 - a
+    return abs(a)
+
+
+def angle_from_matrix(m):
+    """Угол базовой оси X из матрицы (a,b,c,d, e,f)."""
+    try:
+        a = float(m[0]); b = float(m[1])
+        return math.degrees(math.atan2(b, a))
+    except Exception:
+        return None
+
+
+def angle_from_dir(dir_vec):
+    try:
+        dx, dy = dir_vec
+        return math.degrees(math.atan2(dy, dx))
+    except Exception:
+        return None
+
+
+def _round_bbox(x0, y0, x1, y1) -> list[float]:
+    return [round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2)]
+
+
+def _dedup_sorted(items: list[dict], key) -> list[dict]:
+    seen = set()
+    uniq = []
+    for it in items:
+        k = key(it)
+        if k in seen:
+            continue
+        seen.add(k)
+        uniq.append(it)
+    # стабильная сортировка
+    uniq.sort(key=lambda it: (it["bbox"][1], it["bbox"][0], it["kind"]))
+    return uniq
+
+
+class TiltAnalysis:
+    """
+    Наклоны всех текстов страницы, считаются один раз для обоих критериев:
+      - lines — элементы 1.1.5 (строки dict, слова, аннотации; угол без поправки на поворот страницы);
+      - spans — элементы 1.1.6 (спаны dict, аннотации, слова; с полями source / raw_angle_deg / page_rot_deg).
+    Признак «размерный текст» вычисляется пакетом, один раз на уникальную строку страницы.
+    """
+
+    def __init__(self, pc: PageCache):
+        page_rot = pc.rotation
+        lines: list[dict] = []
+        spans: list[dict] = []
+        line_words: list[dict] = []
+        span_words: list[dict] = []
+        line_annots: list[dict] = []
+        span_annots: list[dict] = []
+
+        # 1) textpage.extractDICT(): строка → элемент 1.1.5, её спаны → элементы 1.1.6
+        try:
+            self._collect_dict(pc.textpage_dict(), page_rot, lines, spans)
+        except Exception:
+            pass
+
+        # 2) аннотации
+        try:
+            for a in pc.annotations():
+                text = a["content"]
+                r = a["rect"]
+                bbox = _round_bbox(r.x0, r.y0, r.x1, r.y1)
+                rotation = a["rotation"]
+                line_annots.append({
+                    "kind": f"annot:{a['type']}",
+                    "text": text,
+                    "bbox": bbox,
+                    "size": None,
+                    "angle_deg": round(rotation, 2),
+                    "tilt_deg": round(normalize_tilt(rotation), 2),
+                    "is_dimension": None,
+                })
+                span_annots.append({
+                    "kind": f"annot:{a['type']}",
+                    "text": text,
+                    "bbox": list(bbox),
+                    "size": None,
+                    "raw_angle_deg": round(rotation, 2),
+                    "page_rot_deg": page_rot,
+                    "angle_deg": round(rotation - page_rot, 2),
+                    "tilt_deg": round(normalize_tilt(rotation - page_rot), 2),
+                    "is_dimension": None,
+                    "source": "annotation"
+                })
+        except Exception:
+            pass
+
+        # 3) words fallback (без угла — считаем горизонтальными)
+        try:
+            grouped = defaultdict(list)
+            for (x0, y0, x1, y1, wtext, b, l, wno) in pc.words():
+                grouped[(b, l)].append((x0, y0, x1, y1, wtext))
+            for ws in grouped.values():
+                ws.sort(key=lambda t: t[0])
+                text = " ".join(w[-1] for w in ws).strip()
+                if not text:
+                    continue
+                bbox = _round_bbox(min(w[0] for w in ws), min(w[1] for w in ws),
+                                   max(w[2] for w in ws), max(w[3] for w in ws))
+                line_words.append({
+                    "kind": "text:words",
+                    "text": text,
+                    "bbox": bbox,
+                    "size": None,
+                    "angle_deg": 0.0,
+                    "tilt_deg": 0.0,
+                    "is_dimension": None,
+                })
+                span_words.append({
+                    "kind": "text:words",
+                    "text": text,
+                    "bbox": list(bbox),
+                    "size": None,
+                    "raw_angle_deg": 0.0,
+                    "page_rot_deg": page_rot,
+                    "angle_deg": 0.0,
+                    "tilt_deg": 0.0,
+                    "is_dimension": None,
+                    "source": "words-fallback"
+                })
+        except Exception:
+            pass
+
+        # признак «размерный» — одним пакетом по всем строкам страницы
+        collected = lines + spans + line_words + span_words + line_annots + span_annots
+        dims = classify_dimension_notes(it["text"] for it in collected)
+        for it in collected:
+            it["is_dimension"] = dims[it["text"]]
+
+        # порядок источников до дедупа тот же, что был у каждого критерия
+        self.lines = _dedup_sorted(lines + line_words + line_annots,
+                                   key=lambda it: (it["text"], tuple(it["bbox"])))
+        self.spans = _dedup_sorted(spans + span_annots + span_words,
+                                   key=lambda it: (it["text"], tuple(it["bbox"]), it.get("source")))
+
+    def _collect_dict(self, struct: dict, page_rot: float, lines: list, spans: list):
+        for block in struct.get("blocks", []):
+            if block.get("type", 0) != 0:
+                continue
+            for line in block.get("lines", []):
+                line_spans = line.get("spans", []) or []
+                if not line_spans:
+                    continue
+
+                # --- 1.1.5: строка целиком, угол по dir ---
+                texts = [(s.get("text") or "") for s in line_spans]
+                text = "".join(texts).strip()
+                if text:
+                    x0 = min(float(s["bbox"][0]) for s in line_spans)
+                    y0 = min(float(s["bbox"][1]) for s in line_spans)
+                    x1 = max(float(s["bbox"][2]) for s in line_spans)
+                    y1 = max(float(s["bbox"][3]) for s in line_spans)
+                    size = max(float(s.get("size", 0.0)) for s in line_spans)
+                    dx, dy = line.get("dir", (1.0, 0.0))
+                    angle = math.degrees(math.atan2(dy, dx))
+                    lines.append({
+                        "kind": "text:dict",
+                        "text": text,
+                        "bbox": _round_bbox(x0, y0, x1, y1),
+                        "size": round(size, 2),
+                        "angle_deg": round(angle, 2),
+                        "tilt_deg": round(normalize_tilt(angle), 2),
+                        "is_dimension": None,
+                    })
+
+                # --- 1.1.6: по спанам, угол из матрицы спана, иначе из строки ---
+                # базовый угол по линии (часто бесполезен при вложенных матрицах)
+                line_angle = angle_from_dir(line.get("dir")) if "dir" in line else None
+                for s, raw in zip(line_spans, texts):
+                    stext = raw.strip()
+                    if not stext:
+                        continue
+                    x0, y0, x1, y1 = map(float, s.get("bbox", [0, 0, 0, 0]))
+                    ssize = float(s.get("size", 0.0) or 0.0)
+                    mat = s.get("matrix") or s.get("Matrix") or None  # PyMuPDF версии по-разному именуют
+                    span_angle = angle_from_matrix(mat) if mat else None
+                    angle = span_angle if span_angle is not None else line_angle
+                    if angle is None:
+                        angle = 0.0
+                    angle_corr = angle - float(page_rot or 0.0)
+                    spans.append({
+                        "kind": "text:dict",
+                        "text": stext,
+                        "bbox": _round_bbox(x0, y0, x1, y1),
+                        "size": round(ssize, 2) if ssize else None,
+                        "raw_angle_deg": round(angle, 2),
+                        "page_rot_deg": float(page_rot or 0.0),
+                        "angle_deg": round(angle_corr, 2),
+                        "tilt_deg": round(normalize_tilt(angle_corr), 2),
+                        "is_dimension": None,
+                        "source": "span-matrix" if span_angle is not None else ("line-dir" if line_angle is not None else "fallback-0")
+                    })
+
+
+def tilt_analysis(pc: PageCache) -> TiltAnalysis:
+    """Наклоны страницы с мемоизацией в PageCache (общие для 1.1.5 и 1.1.6)."""
+    return pc.memo("tilt", lambda: TiltAnalysis(pc))
+
+
+def tilt_report(pdf_path: "str | DocumentCache", view: str, angle_threshold: float = 30.0,
+                include_all_kinds=False, verbose=False) -> dict:
+    """
+    Отчёт критерия по одному из представлений: view='lines' (1.1.5) или 'spans' (1.1.6).
+    Формат отчёта прежний: {pdf, threshold_deg, pages: {n: {dimension_items, violations, page_ok}}, ok}.
+    """
+    if view not in ("lines", "spans"):
+        raise ValueError(f"Неизвестное представление: {view}")
+    with open_document(pdf_path) as doc:
+        report = {"pdf": doc.path, "threshold_deg": angle_threshold, "pages": {}, "ok": True}
+        for pc in doc:
+            items = getattr(tilt_analysis(pc), view)
+            if include_all_kinds:
+                candidates = [it for it in items if it["text"]]
+            else:
+                candidates = [it for it in items if it["is_dimension"]]
+            bad = [it for it in candidates if it["tilt_deg"] > angle_threshold]
+            page_ok = len(bad) == 0
+            if not page_ok:
+                report["ok"] = False
+            page_block = {
+                "dimension_items": candidates,
+                "violations": bad,
+                "page_ok": page_ok
+            }
+            if verbose:
+                # немножко статистики для отладки
+                kinds = {}
+                for it in items:
+                    kinds[it["kind"]] = kinds.get(it["kind"], 0) + 1
+                page_block["diagnostics"] = {"counts_by_kind": kinds}
+                if view == "spans":
+                    sources = {}
+                    for it in items:
+                        sources[it["source"]] = sources.get(it["source"], 0) + 1
+                    page_block["diagnostics"]["counts_by_source"] = sources
+                page_block["diagnostics"]["total_items_seen"] = len(items)
+            report["pages"][pc.number] = page_block
+    return report
+
+
+# --- Нарушения обоих критериев одним списком ---
+def _object_text(text) -> str:
+    """Текст надписи с нормализованными пробелами — идентификатор «одного объекта»."""
+    return " ".join(str(text).split())
+
+
+def _bbox_within(inner, outer) -> bool:
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+def tilt_violations(rep_115: dict | None, rep_116: dict | None) -> list[tuple[str, int, dict, float]]:
+    """
+    Нарушения 1.1.5 и 1.1.6 одним списком, каждая надпись — один раз: спан 1.1.6 внутри
+    строки-нарушения 1.1.5 с тем же текстом — та же надпись, остаётся пункт 1.1.5.
+    Элементы: (пункт, лист, элемент отчёта, порог). Дальше (merge_violations) повторов уже не ищут.
+    """
+    out: list[tuple[str, int, dict, float]] = []
+    lines_115: dict[tuple, list] = {}
+    rep_115 = rep_115 or {}
+    for page_idx, block in (rep_115.get("pages") or {}).items():
+        for v in block.get("violations") or []:
+            out.append(("1.1.5", int(page_idx), v, rep_115.get("threshold_deg")))
+            lines_115.setdefault((int(page_idx), _object_text(v.get("text") or "")), []).append(v["bbox"])
+    rep_116 = rep_116 or {}
+    for page_idx, block in (rep_116.get("pages") or {}).items():
+        for v in block.get("violations") or []:
+            covering = lines_115.get((int(page_idx), _object_text(v.get("text") or "")))
+            if covering and any(_bbox_within(v["bbox"], outer) for outer in covering):
+                continue
+            out.append(("1.1.6", int(page_idx), v, rep_116.get("threshold_deg")))
+    return out
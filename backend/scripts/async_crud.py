@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import User, Document, Job
+from .crud import (
+    analyzed_documents_select, apply_document_analysis, apply_report_summary, criterion_result_copies,
+    criterion_results_select, document_summary, first_reusable_analysis, history_page, history_select,
+    needs_report_backfill, read_report_summary, get_password_hash, verify_password,
+)
+from .jobs import latest_job_select, latest_job_statuses_select, new_job
+from .progress import event_to_dict, events_after_select, new_event, notify_select
+from .progress_hub import progress_hub
+
+# =========================
+# Асинхронные версии crud для роутеров API (AsyncSession, см. scripts/db.get_async_db)
+# =========================
+# Запросы и новые объекты строятся общими функциями scripts/crud.py, jobs.py и progress.py
+# (history_select, new_job, events_after_select и т.п.) — здесь только execute/commit.
+# Воркеры и анализ продолжают работать с синхронной сессией.
+
+
+async def _first(db: AsyncSession, stmt):
+    return (await db.execute(stmt.limit(1))).scalars().first()
+
+
+# ---------- Пользователи ----------
+async def authenticate_user(db: AsyncSession, login: str, password: str):
+    user = await get_user_by_login(db, login)
+    if not user or not verify_password(password, user.hashed_password):
+        return False
+    return user
+
+async def create_user(db: AsyncSession, login: str, password: str):
+    user = User(login=login, hashed_password=get_password_hash(password))
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+async def get_user_by_login(db: AsyncSession, login: str):
+    return await _first(db, select(User).where(User.login == login))
+
+
+# ---------- Документы ----------
+async def create_document(db: AsyncSession, user_id: int, filename: str, upload_date: datetime,
+                          parent_id: int = None):
+    doc = Document(user_id=user_id, filename=filename, upload_date=upload_date, parent_id=parent_id)
+    db.add(doc)
+    await db.commit()
+    await db.refresh(doc)
+    return doc
+
+async def get_document(db: AsyncSession, doc_id: int):
+    return await _first(db, select(Document).where(Document.id == doc_id))
+
+async def update_document_analysis(db: AsyncSession, doc_id: int, ann_pdf_path: str, description: str,
+                                   config_hash: str = None, analyzer_version: str = None,
+                                   page_fingerprints: list = None, summary: dict = None,
+                                   violations: list = None, report_text: str = None,
+                                   page_sizes: list = None):
+    doc = await get_document(db, doc_id)
+    if doc:
+        apply_document_analysis(doc, ann_pdf_path, description, config_hash, analyzer_version,
+                                page_fingerprints, summary, violations, report_text, page_sizes)
+        await db.commit()
+    return doc
+
+async def set_document_content_hash(db: AsyncSession, doc_id: int, content_hash: str):
+    doc = await get_document(db, doc_id)
+    if doc:
+        doc.content_hash = content_hash
+        await db.commit()
+    return doc
+
+async def find_analyzed_document(db: AsyncSession, user_id: int, content_hash: str, config_hash: str,
+                                 analyzer_version: str, exclude_id: int = None):
+    """Последний готовый анализ того же PDF этого пользователя (см. crud.analyzed_documents_select)."""
+    stmt = analyzed_documents_select(user_id, content_hash, config_hash, analyzer_version, exclude_id)
+    return first_reusable_analysis((await db.execute(stmt)).scalars())
+
+async def get_document_summary(db: AsyncSession, doc: Document, with_report: bool = False):
+    """Как crud.get_document_summary; разбор старого TXT — в потоке, чтобы не держать цикл событий."""
+    if needs_report_backfill(doc, with_report):
+        parsed = await asyncio.to_thread(read_report_summary, doc.description)
+        if parsed is None:
+            return None
+        apply_report_summary(doc, parsed)
+        await db.commit()
+    return document_summary(doc, with_report)
+
+
+# ---------- История ----------
+async def get_history_page(db: AsyncSession, user_id: int, limit: int = 50, cursor: str = None,
+                           date_from: datetime = None, date_to: datetime = None,
+                           criterion: str = None, filename: str = None, sort: str = "-upload_date"):
+    stmt = history_select(user_id, limit, cursor, date_from, date_to, criterion, filename, sort)
+    return history_page(list((await db.execute(stmt)).scalars().all()), limit, sort)
+
+
+# ---------- Итоги критериев ----------
+async def get_criterion_results(db: AsyncSession, document_id: int):
+    return (await db.execute(criterion_results_select(document_id))).scalars().all()
+
+async def copy_criterion_results(db: AsyncSession, src_id: int, dst_id: int):
+    db.add_all(criterion_result_copies(await get_criterion_results(db, src_id), dst_id))
+    await db.commit()
+
+
+# ---------- Очередь и события ----------
+async def add_event(db: AsyncSession, document_id: int, kind: str, criterion: str = None, payload: dict = None):
+    ev = new_event(document_id, kind, criterion, payload)
+    db.add(ev)
+    notify = notify_select(db.bind, document_id)
+    if notify is not None:
+        await db.execute(notify)
+    await db.commit()
+    progress_hub.notify(document_id)  # потоки /progress этого процесса — без ожидания NOTIFY/опроса
+    return ev
+
+async def enqueue_job(db: AsyncSession, document_id: int, pdf_path: str, max_attempts: int = None) -> Job:
+    job = new_job(document_id, pdf_path, max_attempts)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    await add_event(db, document_id, "queued", payload={"job_id": job.id})
+    return job
+
+async def get_latest_job(db: AsyncSession, document_id: int):
+    return (await db.execute(latest_job_select(document_id))).scalars().first()
+
+async def get_latest_job_statuses(db: AsyncSession, document_ids: list[int]) -> dict[int, str]:
+    if not document_ids:
+        return {}
+    rows = (await db.execute(latest_job_statuses_select(document_ids))).all()
+    return {document_id: status for document_id, status in rows}
+
+async def get_events_after(db: AsyncSession, document_id: int, after_id: int = 0, limit: int = 200) -> list[dict]:
+    rows = (await db.execute(events_after_select(document_id, after_id, limit))).scalars().all()
+    return [event_to_dict(ev) for ev in rows]
@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# =========================
+# Кэш авторизации: расшифрованные токены и id пользователей
+# =========================
+# Middleware проверяет JWT на каждом запросе, а роутерам нужен числовой id пользователя.
+# Токен → (login, uid) и login → uid держим в памяти процесса API с ограничением по времени
+# и размеру; при изменении пользователя записи сбрасываются (invalidate_user / invalidate_token).
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+
+
+class TTLCache:
+    """LRU с временем жизни записи; потокобезопасен (middleware и роутеры в разных потоках)."""
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """ttl — не дольше общего (например, до истечения токена)."""
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate) -> int:
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# token -> {"login": ..., "uid": ...}
+token_cache = TTLCache()
+# login -> uid (для токенов, выданных до появления uid в claims)
+user_id_cache = TTLCache()
+
+
+def invalidate_token(token: str) -> None:
+    token_cache.pop(token)
+
+
+def invalidate_user(login: str) -> None:
+    """Пользователь изменён или удалён: сбрасываем его id и все его расшифрованные токены."""
+    user_id_cache.pop(login)
+    token_cache.discard_where(lambda _token, claims: claims.get("login") == login)
+
+
+def clear_auth_cache() -> None:
+    token_cache.clear()
+    user_id_cache.clear()
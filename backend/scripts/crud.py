@@ -2,9 +2,13 @@ import os
 from dotenv import load_dotenv
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from .models import User, Document
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, defer
+from .models import User, Document, CriterionResult
+from .parse_report import parse_report
+import base64
 import hashlib
+import json
 from pathlib import Path
 load_dotenv()
 
@@ -45,24 +49,318 @@ def create_user(db: Session, login: str, password: str):
 def get_user_by_login(db: Session, login: str):
     return db.query(User).filter(User.login == login).first()
 
-def create_document(db: Session, user_id: int, filename: str, upload_date: datetime):
-    doc = Document(user_id=user_id, filename=filename, upload_date=upload_date)
+def create_document(db: Session, user_id: int, filename: str, upload_date: datetime, parent_id: int = None):
+    doc = Document(user_id=user_id, filename=filename, upload_date=upload_date, parent_id=parent_id)
     db.add(doc)
     db.commit()
     db.refresh(doc)
     return doc
 
-def update_document_analysis(db: Session, doc_id: int, ann_pdf_path: str, description: str):
+def update_document_analysis(db: Session, doc_id: int, ann_pdf_path: str, description: str,
+                             config_hash: str = None, analyzer_version: str = None,
+                             page_fingerprints: list = None, summary: dict = None,
+                             violations: list = None, report_text: str = None,
+                             page_sizes: list = None):
+    """summary — {total_violations, error_counts} (как у parse_report), violations — объединённые кластеры."""
     doc = db.query(Document).filter(Document.id == doc_id).first()
     if doc:
-        doc.ann_pdf_path = str(ann_pdf_path)
-        doc.description = str(description)
+        apply_document_analysis(doc, ann_pdf_path, description, config_hash, analyzer_version,
+                                page_fingerprints, summary, violations, report_text, page_sizes)
         db.commit()
         db.refresh(doc)
     return doc
 
+def apply_document_analysis(doc: Document, ann_pdf_path: str, description: str,
+                            config_hash: str = None, analyzer_version: str = None,
+                            page_fingerprints: list = None, summary: dict = None,
+                            violations: list = None, report_text: str = None, page_sizes: list = None):
+    """Заполняет поля результата анализа (общая часть crud и async_crud)."""
+    doc.ann_pdf_path = str(ann_pdf_path)
+    doc.description = str(description)
+    if summary is not None:
+        doc.total_violations = summary["total_violations"]
+        doc.error_counts = json.dumps(summary["error_counts"], ensure_ascii=False)
+    if violations is not None:
+        doc.violations = json.dumps(violations, ensure_ascii=False, default=str)
+    if report_text is not None:
+        doc.report_text = report_text
+    if page_sizes is not None:
+        doc.page_sizes = json.dumps(page_sizes)
+    if config_hash is not None:
+        doc.config_hash = config_hash
+    if analyzer_version is not None:
+        doc.analyzer_version = analyzer_version
+    if page_fingerprints is not None:
+        doc.page_fingerprints = json.dumps(page_fingerprints)
+
 def get_documents_for_user(db: Session, user_id: int):
-    return db.query(Document).filter(Document.user_id == user_id).all()
+    # список истории: крупные поля отчёта не грузим
+    return (
+        db.query(Document)
+        .options(defer(Document.violations), defer(Document.report_text), defer(Document.page_fingerprints),
+                 defer(Document.page_sizes))
+        .filter(Document.user_id == user_id)
+        .all()
+    )
+
+# ---------- История: курсорная пагинация ----------
+# sort -> (выражение, как значение попадает в курсор и обратно)
+HISTORY_SORTS = {
+    "upload_date": (Document.upload_date, lambda v: v.isoformat() if v else None,
+                    lambda v: datetime.fromisoformat(v) if v else None),
+    # документы в обработке (итога ещё нет) — в конце при сортировке по убыванию
+    "total_violations": (func.coalesce(Document.total_violations, -1), lambda v: v, lambda v: v),
+    "filename": (Document.filename, lambda v: v, lambda v: v),
+}
+HISTORY_MAX_LIMIT = 200
+
+
+def encode_cursor(sort: str, value, doc_id: int) -> str:
+    raw = json.dumps([sort, value, doc_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(sort, значение, id) или ValueError для испорченного курсора."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort, value, doc_id = json.loads(raw)
+        return sort, value, int(doc_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def like_escape(text: str) -> str:
+    """Текст для LIKE ... ESCAPE '\\': %, _ и \\ из ввода пользователя — обычные символы."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def history_select(user_id: int, limit: int = 50, cursor: str = None,
+                   date_from: datetime = None, date_to: datetime = None,
+                   criterion: str = None, filename: str = None, sort: str = "-upload_date"):
+    """
+    Запрос страницы истории (select на limit + 1 строк) — общий для синхронного crud и async_crud.
+    Курсор — последняя строка страницы (значение сортировки, id), без OFFSET:
+    стоимость не растёт с номером страницы.
+    """
+    desc = sort.startswith("-")
+    key = sort.lstrip("-")
+    if key not in HISTORY_SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    column, _dump, load = HISTORY_SORTS[key]
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+
+    stmt = (
+        select(Document)
+        .options(defer(Document.violations), defer(Document.report_text), defer(Document.page_fingerprints),
+                 defer(Document.page_sizes))
+        .where(Document.user_id == user_id)
+    )
+    if date_from is not None:
+        stmt = stmt.where(Document.upload_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Document.upload_date <= date_to)
+    if criterion:
+        # документы, где пункт не пройден; EXISTS идёт по уникальному индексу (document_id, criterion).
+        # У документов, проанализированных до хранения итогов по критериям, строк нет — они не попадают
+        stmt = stmt.where(
+            select(CriterionResult.id)
+            .where(CriterionResult.document_id == Document.id,
+                   CriterionResult.criterion == criterion,
+                   CriterionResult.ok.is_(False))
+            .exists()
+        )
+    if filename:
+        stmt = stmt.where(Document.filename.ilike(f"%{like_escape(filename)}%", escape="\\"))
+    if cursor:
+        c_sort, c_value, c_id = decode_cursor(cursor)
+        if c_sort != sort:
+            raise ValueError("Cursor does not match sort")
+        value = load(c_value)
+        if desc:
+            stmt = stmt.where(or_(column < value, and_(column == value, Document.id < c_id)))
+        else:
+            stmt = stmt.where(or_(column > value, and_(column == value, Document.id > c_id)))
+    if desc:
+        stmt = stmt.order_by(column.desc(), Document.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), Document.id.asc())
+    return stmt.limit(limit + 1)
+
+
+def history_page(docs: list, limit: int, sort: str):
+    """(документы страницы, курсор следующей или None) по результату history_select."""
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    key = sort.lstrip("-")
+    _column, dump, _load = HISTORY_SORTS[key]
+    last_value = getattr(last, key)
+    if key == "total_violations" and last_value is None:
+        last_value = -1
+    return docs, encode_cursor(sort, dump(last_value), last.id)
+
+
+def get_history_page(db: Session, user_id: int, limit: int = 50, cursor: str = None,
+                     date_from: datetime = None, date_to: datetime = None,
+                     criterion: str = None, filename: str = None, sort: str = "-upload_date"):
+    """Страница истории пользователя: (документы, курсор следующей страницы или None)."""
+    stmt = history_select(user_id, limit, cursor, date_from, date_to, criterion, filename, sort)
+    return history_page(db.execute(stmt).scalars().all(), limit, sort)
+
+
+def backfill_document_summaries(db: Session, user_id: int = None) -> int:
+    """
+    Итог в колонках Document для старых документов (однократный разбор их TXT) — при запуске API (app.py),
+    а не на каждый /history. user_id=None — документы всех пользователей.
+    """
+    q = db.query(Document).filter(Document.description.isnot(None), Document.total_violations.is_(None))
+    if user_id is not None:
+        q = q.filter(Document.user_id == user_id)
+    docs = q.all()
+    n = 0
+    for doc in docs:
+        if get_document_summary(db, doc) is not None:
+            n += 1
+    return n
+
 
 def get_document(db: Session, doc_id: int):
-    return db.query(Document).filter(Document.id == doc_id).first()
\ No newline at end of file
+    return db.query(Document).filter(Document.id == doc_id).first()
+
+def read_report_summary(path: str):
+    """Итог из TXT-отчёта (для документов, проанализированных до хранения итога в БД) или None."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_report(f.read())
+
+
+def apply_report_summary(doc: Document, parsed: dict):
+    doc.total_violations = parsed["total_violations"]
+    doc.error_counts = json.dumps(parsed["error_counts"], ensure_ascii=False)
+    doc.report_text = parsed["full_report"]
+
+
+def needs_report_backfill(doc: Document, with_report: bool = False) -> bool:
+    return doc.total_violations is None or (with_report and doc.report_text is None)
+
+
+def document_summary(doc: Document, with_report: bool = False) -> dict:
+    error_counts = json.loads(doc.error_counts) if doc.error_counts else {}
+    out = {
+        "error_points": list(error_counts.keys()),
+        "error_counts": error_counts,
+        "total_violations": doc.total_violations,
+    }
+    if with_report:
+        out["full_report"] = doc.report_text
+    return out
+
+
+def get_document_summary(db: Session, doc: Document, with_report: bool = False):
+    """
+    Итог анализа документа: {error_points, error_counts, total_violations[, full_report]}
+    или None, если отчёта нет. Документы, проанализированные до хранения итога в БД,
+    один раз разбираются из TXT, и итог дописывается в запись.
+    """
+    if needs_report_backfill(doc, with_report):
+        parsed = read_report_summary(doc.description)
+        if parsed is None:
+            return None
+        apply_report_summary(doc, parsed)
+        db.commit()
+    return document_summary(doc, with_report)
+
+def set_document_content_hash(db: Session, doc_id: int, content_hash: str):
+    doc = db.query(Document).filter(Document.id == doc_id).first()
+    if doc:
+        doc.content_hash = content_hash
+        db.commit()
+        db.refresh(doc)
+    return doc
+
+def analyzed_documents_select(user_id: int, content_hash: str, config_hash: str, analyzer_version: str,
+                              exclude_id: int = None):
+    """
+    Готовые анализы того же PDF с той же конфигурацией и версией анализатора у этого же пользователя,
+    новые первыми. Только свои: отчёт и PDF с обводкой содержат имя файла и результаты владельца
+    (у другого пользователя анализ проходит заново, постраничные итоги берутся из ResultCache).
+    """
+    stmt = select(Document).where(
+        Document.user_id == user_id,
+        Document.content_hash == content_hash,
+        Document.config_hash == config_hash,
+        Document.analyzer_version == analyzer_version,
+        Document.ann_pdf_path.isnot(None),
+        Document.description.isnot(None),
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(Document.id != exclude_id)
+    return stmt.order_by(Document.id.desc())
+
+def first_reusable_analysis(docs):
+    """Первый из analyzed_documents_select, чьи файлы на месте, или None."""
+    for doc in docs:
+        # файлы могли удалить вручную — такой анализ не переиспользуем
+        # (PDF с обводкой может быть ещё не построен — тогда нужны нарушения, по которым его построить)
+        annotated = doc.violations is not None or os.path.exists(doc.ann_pdf_path)
+        if annotated and os.path.exists(doc.description):
+            return doc
+    return None
+
+def find_analyzed_document(db: Session, user_id: int, content_hash: str, config_hash: str, analyzer_version: str,
+                           exclude_id: int = None):
+    """Последний готовый анализ того же PDF этого пользователя (см. analyzed_documents_select)."""
+    stmt = analyzed_documents_select(user_id, content_hash, config_hash, analyzer_version, exclude_id)
+    return first_reusable_analysis(db.execute(stmt).scalars())
+
+def get_parent_page_fingerprints(db: Session, doc_id: int):
+    """(id предыдущей ревизии, её отпечатки страниц) или None, если документ не ревизия или её ещё не проанализировали."""
+    doc = db.query(Document).filter(Document.id == doc_id).first()
+    if not doc or not doc.parent_id:
+        return None
+    parent = db.query(Document).filter(Document.id == doc.parent_id).first()
+    if not parent or not parent.page_fingerprints:
+        return None
+    return parent.id, json.loads(parent.page_fingerprints)
+
+def save_criterion_result(db: Session, document_id: int, criterion: str, ok, comment: str = None,
+                          violations: list = None, seconds: float = None):
+    """Итог критерия: запись на пару (документ, критерий), повторная попытка анализа её перезаписывает."""
+    row = db.query(CriterionResult).filter(
+        CriterionResult.document_id == document_id, CriterionResult.criterion == criterion
+    ).first()
+    if row is None:
+        row = CriterionResult(document_id=document_id, criterion=criterion)
+        db.add(row)
+    row.ok = ok
+    row.comment = comment
+    row.violations = json.dumps(violations or [], ensure_ascii=False)
+    row.seconds = seconds
+    row.updated_at = datetime.utcnow()
+    db.commit()
+    return row
+
+def criterion_results_select(document_id: int):
+    return (
+        select(CriterionResult)
+        .where(CriterionResult.document_id == document_id)
+        .order_by(CriterionResult.criterion)
+    )
+
+def criterion_result_copies(rows, dst_id: int) -> list:
+    """Копии итогов критериев для документа dst_id (повторная загрузка того же PDF)."""
+    return [CriterionResult(document_id=dst_id, criterion=row.criterion, ok=row.ok, comment=row.comment,
+                            violations=row.violations, seconds=row.seconds, updated_at=row.updated_at)
+            for row in rows]
+
+def get_criterion_results(db: Session, document_id: int):
+    return db.execute(criterion_results_select(document_id)).scalars().all()
+
+def copy_criterion_results(db: Session, src_id: int, dst_id: int):
+    """Итоги критериев переиспользованного анализа (повторная загрузка того же PDF)."""
+    db.add_all(criterion_result_copies(get_criterion_results(db, src_id), dst_id))
+    db.commit()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,7 +8,49 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# =========================
+# Движки: синхронный (воркеры, скрипты) и асинхронный (роутеры API)
+# =========================
+# Пул соединений для серверных БД (PostgreSQL); у SQLite свой пул и эти параметры не используются
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# сколько секунд SQLite ждёт снятия блокировки записи, прежде чем ответить «database is locked»
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+_is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _engine_kwargs() -> dict:
+    if _is_sqlite:
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    """
+    WAL: читатели (API) не блокируются писателями (воркеры) и наоборот;
+    synchronous=NORMAL в режиме WAL безопасен и не делает fsync на каждый коммит.
+    """
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000}")
+    cur.close()
+
+
+# API и процессы воркеров пишут в одну БД: SQLite ждёт снятия блокировки, а не падает сразу
+_connect_args = {"timeout": SQLITE_BUSY_TIMEOUT} if _is_sqlite else {}
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args, **_engine_kwargs())
+if _is_sqlite:
+    event.listen(engine, "connect", _sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -18,4 +60,69 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _async_url(url: str) -> str:
+    """Тот же DATABASE_URL с асинхронным драйвером: aiosqlite для SQLite, asyncpg для PostgreSQL."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(SQLALCHEMY_DATABASE_URL)
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """Асинхронный движок создаётся при первом обращении: воркерам aiosqlite/asyncpg не нужны."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=_connect_args, **_engine_kwargs())
+        if _is_sqlite:
+            event.listen(_async_engine.sync_engine, "connect", _sqlite_pragmas)
+        # expire_on_commit=False: после commit атрибуты не перечитываются (ленивая загрузка в async недоступна)
+        _async_sessionmaker = async_sessionmaker(_async_engine, class_=AsyncSession,
+                                                 autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _async_sessionmaker()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def ensure_schema(metadata):
+    """
+    create_all не меняет существующие таблицы: добавляем недостающие (nullable) колонки
+    и индексы моделей через ALTER TABLE / CREATE INDEX, чтобы старая БД продолжала работать.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.schema import CreateIndex
+
+    metadata.create_all(bind=engine)
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}')
+            indexes = {ix["name"] for ix in insp.get_indexes(table.name)}
+            for ix in table.indexes:
+                if ix.name not in indexes:
+                    conn.execute(CreateIndex(ix))
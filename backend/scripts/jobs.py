@@ -0,0 +1,173 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.orm import Session
+from .models import Job
+from .progress import add_event
+
+# =========================
+# Очередь заданий анализа (в той же БД, по умолчанию SQLite)
+# =========================
+# Задание забирает воркер (worker.py): ставит себе аренду lease_until и продлевает её, пока работает.
+# Если процесс воркера упал или был перезапущен, аренда истекает и задание забирает другой воркер.
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_SECONDS = int(os.getenv("JOB_RETRY_DELAY_SECONDS", "30"))
+
+
+# Построение задания и запросов — общее для синхронной версии и scripts/async_crud.py
+def new_job(document_id: int, pdf_path: str, max_attempts: int = None) -> Job:
+    now = datetime.utcnow()
+    return Job(
+        document_id=document_id,
+        pdf_path=str(pdf_path),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def latest_job_select(document_id: int):
+    return select(Job).where(Job.document_id == document_id).order_by(Job.id.desc()).limit(1)
+
+
+def latest_job_statuses_select(document_ids: list[int]):
+    """(document_id, status) последнего задания по каждому документу — одним запросом."""
+    latest = (
+        select(func.max(Job.id))
+        .where(Job.document_id.in_(document_ids))
+        .group_by(Job.document_id)
+    )
+    return select(Job.document_id, Job.status).where(Job.id.in_(latest))
+
+
+def enqueue_job(db: Session, document_id: int, pdf_path: str, max_attempts: int = None) -> Job:
+    job = new_job(document_id, pdf_path, max_attempts)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    add_event(db, document_id, "queued", payload={"job_id": job.id})
+    return job
+
+
+def _claimable(now: datetime):
+    return and_(
+        Job.attempts < Job.max_attempts,
+        or_(
+            and_(Job.status == "queued", or_(Job.run_after.is_(None), Job.run_after <= now)),
+            and_(Job.status == "running", Job.lease_until < now),
+        ),
+    )
+
+
+def fail_expired_jobs(db: Session) -> int:
+    """Задания с истёкшей арендой и исчерпанными попытками — в failed (иначе документ навсегда «processing»)."""
+    now = datetime.utcnow()
+    error = "Аренда истекла: воркер не завершил задание"
+    expired = (
+        db.query(Job.id, Job.document_id)
+        .filter(Job.status == "running", Job.lease_until < now, Job.attempts >= Job.max_attempts)
+        .all()
+    )
+    n = 0
+    for job_id, document_id in expired:
+        # условие повторяем: задание могли завершить между выборкой и обновлением
+        updated = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == "running", Job.lease_until < now)
+            .update({Job.status: "failed", Job.error: error, Job.updated_at: now}, synchronize_session=False)
+        )
+        db.commit()
+        if updated:
+            n += 1
+            add_event(db, document_id, "failed", payload={"job_id": job_id, "error": error})
+    return n
+
+
+def claim_job(db: Session, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Job | None:
+    """
+    Забирает самое старое доступное задание. Захват — условный UPDATE по id с повтором условия:
+    если другой воркер успел раньше, rowcount == 0 и берём следующее.
+    """
+    for _ in range(5):
+        now = datetime.utcnow()
+        candidate = db.query(Job.id).filter(_claimable(now)).order_by(Job.id).first()
+        if candidate is None:
+            return None
+        n = (
+            db.query(Job)
+            .filter(Job.id == candidate.id, _claimable(now))
+            .update({
+                Job.status: "running",
+                Job.worker_id: worker_id,
+                Job.lease_until: now + timedelta(seconds=lease_seconds),
+                Job.attempts: Job.attempts + 1,
+                Job.updated_at: now,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if n == 1:
+            job = db.query(Job).filter(Job.id == candidate.id).first()
+            add_event(db, job.document_id, "started", payload={"job_id": job.id, "attempt": job.attempts})
+            return job
+    return None
+
+
+def heartbeat(db: Session, job_id: int, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Продлевает аренду; False — задание уже не наше (аренда истекла и его забрал другой воркер)."""
+    now = datetime.utcnow()
+    n = (
+        db.query(Job)
+        .filter(Job.id == job_id, Job.worker_id == worker_id, Job.status == "running")
+        .update({Job.lease_until: now + timedelta(seconds=lease_seconds), Job.updated_at: now},
+                synchronize_session=False)
+    )
+    db.commit()
+    return n == 1
+
+
+def complete_job(db: Session, job_id: int, worker_id: str) -> None:
+    now = datetime.utcnow()
+    db.query(Job).filter(Job.id == job_id, Job.worker_id == worker_id).update(
+        {Job.status: "done", Job.lease_until: None, Job.error: None, Job.updated_at: now},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str) -> None:
+    """Ошибка попытки: повтор через JOB_RETRY_DELAY_SECONDS, пока не исчерпаны попытки."""
+    job = db.query(Job).filter(Job.id == job_id, Job.worker_id == worker_id).first()
+    if not job:
+        return
+    now = datetime.utcnow()
+    job.error = error
+    job.lease_until = None
+    job.updated_at = now
+    if job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.run_after = now + timedelta(seconds=JOB_RETRY_DELAY_SECONDS * job.attempts)
+    else:
+        job.status = "failed"
+    db.commit()
+    # клиенту — только последняя строка трассировки (сама ошибка), полный текст остаётся в jobs.error
+    message = error.strip().splitlines()[-1] if error.strip() else ""
+    add_event(db, job.document_id, "retry" if job.status == "queued" else "failed", payload={
+        "job_id": job.id, "attempt": job.attempts, "max_attempts": job.max_attempts,
+        "run_after": job.run_after if job.status == "queued" else None, "error": message,
+    })
+
+
+def get_latest_job(db: Session, document_id: int) -> Job | None:
+    return db.execute(latest_job_select(document_id)).scalars().first()
+
+
+def get_latest_job_statuses(db: Session, document_ids: list[int]) -> dict[int, str]:
+    """Статус последнего задания по каждому документу — одним запросом (для списка истории)."""
+    if not document_ids:
+        return {}
+    rows = db.execute(latest_job_statuses_select(document_ids)).all()
+    return {document_id: status for document_id, status in rows}
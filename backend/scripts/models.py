@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
 from .db import Base
 
 class User(Base):
@@ -9,9 +9,65 @@ class User(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    # история пользователя: фильтр по user_id, порядок/курсор по дате загрузки
+    __table_args__ = (Index("ix_documents_user_upload", "user_id", "upload_date", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     filename = Column(String)
     upload_date = Column(DateTime)
     ann_pdf_path = Column(String, nullable=True)
-    description = Column(String, nullable=True)
\ No newline at end of file
+    description = Column(String, nullable=True)
+    # sha256 содержимого загруженного PDF и с чем он был проанализирован — для повторного использования результата
+    content_hash = Column(String, nullable=True, index=True)
+    config_hash = Column(String, nullable=True)
+    analyzer_version = Column(String, nullable=True)
+    # ревизии: предыдущая версия того же чертежа и отпечатки страниц (JSON-список, по порядку листов)
+    parent_id = Column(Integer, ForeignKey("documents.id"), nullable=True, index=True)
+    page_fingerprints = Column(Text, nullable=True)
+    # итог анализа в БД: /result и /history не читают и не разбирают TXT (он остаётся как выгрузка)
+    total_violations = Column(Integer, nullable=True)
+    error_counts = Column(Text, nullable=True)   # JSON: {пункт: число описаний}
+    violations = Column(Text, nullable=True)     # JSON: объединённые кластеры [{num, page, bbox, criteria, items}]
+    page_sizes = Column(Text, nullable=True)     # JSON: [[ширина, высота, поворот], ...] в пунктах, по листам
+    report_text = Column(Text, nullable=True)
+
+class Job(Base):
+    """Задание очереди анализа (см. scripts/jobs.py и worker.py)."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    pdf_path = Column(String)
+    # queued → running → done | failed; running с истёкшей арендой снова забирается воркером
+    status = Column(String, index=True, default="queued")
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, nullable=True)    # не раньше (пауза перед повтором)
+    lease_until = Column(DateTime, nullable=True)  # аренда воркера, продлевается heartbeat'ом
+    worker_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+class AnalysisEvent(Base):
+    """Событие хода анализа документа (для /progress: SSE и long-poll)."""
+    __tablename__ = "analysis_events"
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    # queued / started / criterion / retry / done / failed
+    kind = Column(String)
+    criterion = Column(String, nullable=True)
+    payload = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime)
+
+class CriterionResult(Base):
+    """Итог одного критерия по документу — сохраняется сразу по готовности критерия (частичный /result)."""
+    __tablename__ = "criterion_results"
+    __table_args__ = (Index("ix_criterion_results_document_criterion", "document_id", "criterion", unique=True),)
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"))
+    criterion = Column(String)
+    ok = Column(Boolean, nullable=True)     # None — проверка не выполнена (LLM без ключа и т.п.)
+    comment = Column(Text, nullable=True)
+    violations = Column(Text, nullable=True)  # JSON: [{page, bbox, note}], до объединения кластеров
+    seconds = Column(Float, nullable=True)
+    updated_at = Column(DateTime)
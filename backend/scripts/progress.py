@@ -0,0 +1,68 @@
+import json
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import AnalysisEvent
+
+# =========================
+# События хода анализа (пишут воркеры, читает /progress)
+# =========================
+
+# после этих событий поток для документа закрывается
+TERMINAL_EVENTS = ("done", "failed")
+
+# PostgreSQL: NOTIFY о событии уходит при commit вместе с ним — /progress просыпается сразу
+# (см. scripts/progress_hub.py); payload — id документа
+PROGRESS_CHANNEL = "analysis_events"
+
+
+# Построение события и запроса — общее для синхронной версии и scripts/async_crud.py
+def new_event(document_id: int, kind: str, criterion: str = None, payload: dict = None) -> AnalysisEvent:
+    return AnalysisEvent(
+        document_id=document_id,
+        kind=kind,
+        criterion=criterion,
+        payload=json.dumps(payload, ensure_ascii=False, default=str) if payload is not None else None,
+        created_at=datetime.utcnow(),
+    )
+
+
+def notify_select(bind, document_id: int):
+    """pg_notify о новом событии документа; None — у БД нет LISTEN/NOTIFY (SQLite)."""
+    if bind.dialect.name != "postgresql":
+        return None
+    return select(func.pg_notify(PROGRESS_CHANNEL, str(document_id)))
+
+
+def events_after_select(document_id: int, after_id: int = 0, limit: int = 200):
+    return (
+        select(AnalysisEvent)
+        .where(AnalysisEvent.document_id == document_id, AnalysisEvent.id > after_id)
+        .order_by(AnalysisEvent.id)
+        .limit(limit)
+    )
+
+
+def add_event(db: Session, document_id: int, kind: str, criterion: str = None, payload: dict = None) -> AnalysisEvent:
+    ev = new_event(document_id, kind, criterion, payload)
+    db.add(ev)
+    notify = notify_select(db.get_bind(), document_id)
+    if notify is not None:
+        db.execute(notify)
+    db.commit()
+    return ev
+
+
+def get_events_after(db: Session, document_id: int, after_id: int = 0, limit: int = 200) -> list[dict]:
+    rows = db.execute(events_after_select(document_id, after_id, limit)).scalars().all()
+    return [event_to_dict(ev) for ev in rows]
+
+
+def event_to_dict(ev: AnalysisEvent) -> dict:
+    return {
+        "id": ev.id,
+        "kind": ev.kind,
+        "criterion": ev.criterion,
+        "data": json.loads(ev.payload) if ev.payload else {},
+        "created_at": ev.created_at,
+    }
@@ -0,0 +1,74 @@
+import asyncio
+from .db import get_async_engine
+from .progress import PROGRESS_CHANNEL
+
+# =========================
+# Пробуждение /progress при новых событиях (вместо опроса БД по таймеру)
+# =========================
+# Ожидающие потоки /progress подписываются на документ (asyncio.Event в процессе API). Будят их:
+#  - add_event из этого же процесса (async_crud) — напрямую;
+#  - воркеры — через PostgreSQL NOTIFY (одно соединение с LISTEN на процесс API).
+# С SQLite уведомлений от воркеров нет: /progress перечитывает события с растущей паузой.
+
+
+class ProgressHub:
+    """Подписки на события документов в процессе API."""
+
+    def __init__(self):
+        self._waiters: dict[int, set[asyncio.Event]] = {}
+        self._conn = None  # соединение с LISTEN (только PostgreSQL)
+        self._start_lock: asyncio.Lock | None = None
+
+    @property
+    def listening(self) -> bool:
+        """True — события воркеров приходят уведомлениями, опрос БД нужен только для подстраховки."""
+        return self._conn is not None
+
+    def subscribe(self, doc_id: int) -> asyncio.Event:
+        wake = asyncio.Event()
+        self._waiters.setdefault(doc_id, set()).add(wake)
+        return wake
+
+    def unsubscribe(self, doc_id: int, wake: asyncio.Event) -> None:
+        waiters = self._waiters.get(doc_id)
+        if waiters is not None:
+            waiters.discard(wake)
+            if not waiters:
+                del self._waiters[doc_id]
+
+    def notify(self, doc_id: int) -> None:
+        for wake in self._waiters.get(doc_id, ()):
+            wake.set()
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        if payload.isdigit():
+            self.notify(int(payload))
+
+    def _on_lost(self, _conn) -> None:
+        # соединение с LISTEN оборвалось — до переподключения (следующий start) работает опрос с паузой
+        self._conn = None
+
+    async def start(self) -> None:
+        """LISTEN на PostgreSQL (один раз на процесс; после обрыва — заново). Для SQLite ничего не делает."""
+        if self._conn is not None:
+            return
+        engine = get_async_engine()
+        if engine.dialect.name != "postgresql":
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._conn is not None:
+                return
+            try:
+                conn = await engine.connect()
+                raw = (await conn.get_raw_connection()).driver_connection  # asyncpg.Connection
+                await raw.add_listener(PROGRESS_CHANNEL, self._on_notify)
+                raw.add_termination_listener(self._on_lost)
+            except Exception as e:
+                print(f"[progress] LISTEN {PROGRESS_CHANNEL} не включён, события читаются опросом: {e}")
+                return
+            self._conn = conn
+
+
+progress_hub = ProgressHub()
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from scripts.db import SessionLocal, ensure_schema
+from scripts.models import Base
+from scripts.crud import get_document
+from scripts.jobs import (
+    JOB_LEASE_SECONDS, claim_job, complete_job, fail_expired_jobs, fail_job, heartbeat,
+)
+
+# Воркеры очереди анализа: запускаются отдельно от API (python worker.py) и масштабируются независимо
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+
+def _log(msg: str):
+    print(f"[worker {os.getpid()}] {msg}", flush=True)
+
+
+def _keep_lease(job_id: int, worker_id: str, done: threading.Event):
+    """Продлевает аренду задания, пока идёт анализ."""
+    while not done.wait(JOB_LEASE_SECONDS / 3):
+        with SessionLocal() as db:
+            if not heartbeat(db, job_id, worker_id):
+                _log(f"задание {job_id}: аренда потеряна")
+                return
+
+
+def worker_loop():
+    # тяжёлый импорт (PyMuPDF и критерии) — только в процессе воркера
+    from scripts.analysis.main import make_report_files
+    from scripts.analysis.tiles import TILE_PREWARM_ZOOM, prewarm_tiles, tile_source_id
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    # SIGTERM/SIGINT: дорабатываем текущее задание и выходим
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    _log("запущен")
+
+    while not stop.is_set():
+        with SessionLocal() as db:
+            fail_expired_jobs(db)
+            job = claim_job(db, worker_id)
+            job_id = job.id if job else None
+            pdf_path = job.pdf_path if job else None
+            document_id = job.document_id if job else None
+        if job_id is None:
+            stop.wait(JOB_POLL_SECONDS)
+            continue
+
+        _log(f"задание {job_id}: документ {document_id}")
+        done = threading.Event()
+        beat = threading.Thread(target=_keep_lease, args=(job_id, worker_id, done), daemon=True)
+        beat.start()
+        t0 = time.perf_counter()
+        try:
+            make_report_files(pdf_path, document_id)
+        except Exception:
+            err = traceback.format_exc()
+            _log(f"задание {job_id}: ошибка\n{err}")
+            with SessionLocal() as db:
+                fail_job(db, job_id, worker_id, err)
+        else:
+            with SessionLocal() as db:
+                complete_job(db, job_id, worker_id)
+            _log(f"задание {job_id}: готово за {time.perf_counter() - t0:.1f} с")
+            # превью мелких уровней — после завершения задания: клиент уже получил «done»
+            if TILE_PREWARM_ZOOM >= 0:
+                try:
+                    with SessionLocal() as db:
+                        doc = get_document(db, document_id)
+                        source_id = tile_source_id(document_id, doc.content_hash if doc else None)
+                    t1 = time.perf_counter()
+                    made = prewarm_tiles(pdf_path, source_id)
+                    _log(f"документ {document_id}: {made} плиток превью за {time.perf_counter() - t1:.1f} с")
+                except Exception as e:
+                    _log(f"документ {document_id}: плитки превью не построены: {e}")
+        finally:
+            done.set()
+            beat.join()
+    _log("остановлен")
+
+
+def main():
+    ensure_schema(Base.metadata)
+    if WORKER_PROCESSES <= 1:
+        worker_loop()
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+
+    def _start():
+        p = ctx.Process(target=worker_loop)
+        p.start()
+        return p
+
+    def _stop(*_):
+        stopping.set()
+        for p in procs:
+            if p.is_alive():
+                p.terminate()  # SIGTERM: воркер завершит текущее задание
+
+    procs = [_start() for _ in range(WORKER_PROCESSES)]
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    # упавший процесс перезапускаем; его задание заберут после истечения аренды
+    while not stopping.is_set():
+        for i, p in enumerate(procs):
+            if not p.is_alive():
+                _log(f"процесс {p.pid} завершился (код {p.exitcode}), перезапуск")
+                procs[i] = _start()
+        stopping.wait(1.0)
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
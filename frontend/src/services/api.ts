@@ -48,6 +48,41 @@ export interface HistoryItem {
   status: 'processing' | 'completed' | 'error' // Добавлено поле статуса
 }
 
+// Параметры GET /history (курсорная пагинация и фильтры на сервере)
+export interface HistoryQuery {
+  limit?: number
+  cursor?: string
+  date_from?: string
+  date_to?: string
+  criterion?: string
+  filename?: string
+  sort?: string
+}
+
+export interface HistoryPage {
+  items: HistoryItem[]
+  nextCursor: string | null
+}
+
+// Итог одного критерия: done — уже посчитан, pending — ещё в работе
+export interface CriterionStatus {
+  status: 'done' | 'pending'
+  ok?: boolean | null
+  comment?: string | null
+  violation_count?: number
+  violations?: { page: number; bbox: number[]; note: string }[]
+  seconds?: number | null
+}
+
+// Кластер нарушений (как в TXT-реестре): bbox — [x0, y0, x1, y1] в пунктах от левого верхнего угла листа
+export interface Violation {
+  num: number
+  page: number
+  bbox: number[]
+  criteria: string[]
+  items: { criterion: string; note: string }[]
+}
+
 export interface DetailedResult {
   id: string
   filename: string
@@ -56,6 +91,30 @@ export interface DetailedResult {
   error_counts: ErrorCounts
   total_violations: number
   full_report: string
+  // объединённые нарушения (как в TXT-реестре); null — документ проанализирован до их хранения в БД
+  violations?: Violation[] | null
+  criteria?: Record<string, CriterionStatus>
+}
+
+// Рамки для отрисовки поверх оригинала (GET /overlay/{doc_id}); размеры листа — без учёта поворота
+export interface OverlayPage {
+  page: number
+  width: number
+  height: number
+  rotation: number
+}
+
+export interface Overlay {
+  id: number
+  pages: OverlayPage[]
+  violations: Violation[]
+}
+
+// Событие хода анализа (GET /progress/{doc_id}/stream)
+export interface ProgressEvent {
+  id: number
+  kind: 'queued' | 'started' | 'criterion' | 'retry' | 'done' | 'failed'
+  data: Record<string, any>
 }
 
 export class ApiError extends Error {
@@ -223,9 +282,13 @@ class ApiClient {
   }
 
   // 2. POST /upload - File Upload
-  async uploadFile(file: File): Promise<UploadResponse> {
+  async uploadFile(file: File, revisionOf?: string | number): Promise<UploadResponse> {
     const formData = new FormData()
     formData.append('file', file)
+    // Новая ревизия ранее загруженного чертежа: неизменённые листы не пересчитываются
+    if (revisionOf !== undefined && revisionOf !== null) {
+      formData.append('revision_of', String(revisionOf))
+    }
 
     return await this.request<UploadResponse>('/upload', {
       method: 'POST',
@@ -286,6 +349,24 @@ class ApiClient {
     })
   }
 
+  // 5a. GET /history?cursor=... - One page of history; next cursor comes in X-Next-Cursor
+  async getHistoryPage(query: HistoryQuery = {}): Promise<HistoryPage> {
+    const params = new URLSearchParams()
+    for (const [key, value] of Object.entries(query)) {
+      if (value !== undefined && value !== null && value !== '') params.append(key, String(value))
+    }
+    const qs = params.toString()
+    const response = await fetch(`${this.baseURL}/history${qs ? `?${qs}` : ''}`, {
+      method: 'GET',
+      headers: {
+        'Content-Type': 'application/json',
+        ...this.getAuthHeaders(),
+      },
+    })
+    const items = await this.handleResponse<HistoryItem[]>(response)
+    return { items, nextCursor: response.headers.get('X-Next-Cursor') }
+  }
+
   // 6. GET /result/{doc_id} - Get Detailed Result
   async getResult(docId: string): Promise<DetailedResult> {
     return await this.request<DetailedResult>(`/result/${docId}`, {
@@ -297,6 +378,100 @@ class ApiClient {
     })
   }
 
+  // 7. GET /progress/{doc_id}/stream - Analysis progress (Server-Sent Events)
+  // EventSource не умеет передавать заголовок Authorization, поэтому поток читается через fetch.
+  // Промис завершается после события done/failed или при отмене через signal.
+  async watchProgress(
+    docId: string,
+    onEvent: (event: ProgressEvent) => void,
+    signal?: AbortSignal,
+  ): Promise<void> {
+    let lastId = 0
+    let finished = false
+
+    while (!finished && !signal?.aborted) {
+      const response = await this.request<Response>(`/progress/${docId}/stream?after=${lastId}`, {
+        method: 'GET',
+        headers: {
+          Accept: 'text/event-stream',
+          ...this.getAuthHeaders(),
+        },
+        signal,
+      })
+      if (!(response instanceof Response) || !response.body) {
+        throw new ApiError({
+          message: 'Invalid response format for progress stream',
+          code: 'INVALID_RESPONSE',
+        })
+      }
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+      let buffer = ''
+      try {
+        for (;;) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += value
+          let sep: number
+          while ((sep = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, sep)
+            buffer = buffer.slice(sep + 2)
+            let id = 0
+            let kind = ''
+            let data = ''
+            for (const line of block.split('\n')) {
+              if (line.startsWith('id: ')) id = Number(line.slice(4))
+              else if (line.startsWith('event: ')) kind = line.slice(7)
+              else if (line.startsWith('data: ')) data += line.slice(6)
+            }
+            if (!kind) continue // retry / keepalive
+            if (id) lastId = id
+            onEvent({ id, kind: kind as ProgressEvent['kind'], data: data ? JSON.parse(data) : {} })
+            if (kind === 'done' || kind === 'failed') finished = true
+          }
+        }
+      } finally {
+        reader.releaseLock()
+      }
+      // соединение оборвалось до итогового события — переподключаемся с последнего id
+    }
+  }
+
+  // 8. GET /overlay/{doc_id} - Violation boxes to draw over the original PDF
+  async getOverlay(docId: string, filter: { page?: number; criterion?: string } = {}): Promise<Overlay> {
+    const params = new URLSearchParams()
+    if (filter.page) params.set('page', String(filter.page))
+    if (filter.criterion) params.set('criterion', filter.criterion)
+    const qs = params.toString()
+    return await this.request<Overlay>(`/overlay/${docId}${qs ? `?${qs}` : ''}`, {
+      method: 'GET',
+      headers: {
+        'Content-Type': 'application/json',
+        ...this.getAuthHeaders(),
+      },
+    })
+  }
+
+  // 9. GET /documents/{doc_id}/pages/{page}/tiles/{z}/{x}/{y}.png - Page preview tile
+  // <img src> не передаёт Authorization — плитка берётся как Blob (URL.createObjectURL на стороне компонента)
+  async getPageTile(docId: string, page: number, z: number, x: number, y: number): Promise<Blob> {
+    const response = await this.request<Response>(`/documents/${docId}/pages/${page}/tiles/${z}/${x}/${y}.png`, {
+      method: 'GET',
+      headers: {
+        ...this.getAuthHeaders(),
+      },
+    })
+
+    if (response instanceof Response) {
+      return await response.blob()
+    }
+
+    throw new ApiError({
+      message: 'Invalid response format for page tile',
+      code: 'INVALID_RESPONSE',
+    })
+  }
+
   // Logout - Clear stored token
   logout(): void {
     TokenManager.removeToken()
@@ -325,7 +500,10 @@ export const api = {
 
   // Data retrieval
   getHistory: () => apiClient.getHistory(),
+  getHistoryPage: (query?: HistoryQuery) => apiClient.getHistoryPage(query),
   getResult: (docId: string) => apiClient.getResult(docId),
+  watchProgress: (docId: string, onEvent: (event: ProgressEvent) => void, signal?: AbortSignal) =>
+    apiClient.watchProgress(docId, onEvent, signal),
 }
 
 // Error handling utilities